@@ -127,9 +127,11 @@ setup(
 
         keywords = ['python', 'udev', 'gnome'],
 
-        packages = ['udevdiscover', 'udevdiscover.device', 
-            'udevdiscover.device.block', 'udevdiscover.device.input'], 
+        packages = ['udevdiscover', 'udevdiscover.backend',
+            'udevdiscover.device', 'udevdiscover.device.block',
+            'udevdiscover.device.input'], 
         package_dir =  {'udevdiscover': 'udevdiscover', 
+            'udevdiscover.backend': 'udevdiscover/backend',
             'udevdiscover.device': 'udevdiscover/device',
             'udevdiscover.device.block': 'udevdiscover/device/block',
             'udevdiscover.device.input': 'udevdiscover/device/input',
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+A synthetic devices tree for the tests, through the fixture backend
+'''
+
+from udevdiscover.backend.fixture import FixtureBackend
+from udevdiscover.devicefinder import DeviceFinder
+
+def synthetic_finder(count, parent_tree=True):
+    '''A DeviceFinder scanning a synthetic tree of about count devices'''
+
+    backend = FixtureBackend()
+    share = max(count / 10, 1)
+    backend.generate(pci=share, usb=share, block=share, net=share * 2,
+        input=share)
+
+    finder = DeviceFinder(backend=backend)
+    finder.scan_subsystems('', parent_tree)
+    return finder
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+ClassCodeIndex against the class code lookup it replaced.
+
+Run the tests with: python -m unittest discover -s tests
+'''
+
+import unittest
+
+from udevdiscover.device import pci, usb
+
+def legacy_short_long_names(names, unknown, klass, subclass, protocol):
+    '''The class code lookup ClassCodeIndex replaced, as a reference'''
+
+    key = [klass]
+    klasses = [k for k in names.keys() if k[0] == klass]
+    if not klasses:
+        return unknown
+
+    if not [s for s in klasses if s[1] == subclass]:
+        key.append(-1)
+    else:
+        key.append(subclass)
+
+    if not (key[0], key[1], protocol) in klasses:
+        key.append(-1)
+    else:
+        key.append(protocol)
+
+    if names.has_key(tuple(key)):
+        return names[tuple(key)]
+    else:
+        return names[(klass, -1, -1)]
+
+def class_code_space(names):
+    '''
+    One (class, subclass, protocol) code of each kind the lookup can tell
+    apart: those on the table, plus one missing subclass and protocol for
+    each class.
+
+    The reference only asks whether the subclass, and then the protocol,
+    of a code are on the table for its class, so any other code answers
+    as one of these. Going through all the 2^24 codes instead takes
+    minutes, as the reference walks the table on every lookup.
+    '''
+    for klass in xrange(256):
+        subclasses = set([k[1] for k in names if k[0] == klass])
+        protocols = set([k[2] for k in names if k[0] == klass])
+        for subclass in subclasses | set([min(set(xrange(256)) - subclasses)]):
+            for protocol in protocols | set([min(set(xrange(256)) - protocols)]):
+                yield klass, subclass, protocol
+
+class ClassCodeIndexTest(unittest.TestCase):
+
+    def assertMatchesLegacy(self, names, unknown, index):
+        for code in class_code_space(names):
+            self.assertEqual(index.lookup(*code),
+                legacy_short_long_names(names, unknown, *code),
+                'class code %02x:%02x:%02x' % code)
+
+    def test_pci(self):
+        self.assertMatchesLegacy(pci.pci_class_names,
+            (pci.UNKNOWN_NAME, pci.UNKNOWN_NAME), pci.pci_class_index)
+
+    def test_usb(self):
+        self.assertMatchesLegacy(usb.usb_class_names, (None, None),
+            usb.usb_class_index)
+
+if __name__ == '__main__':
+    unittest.main()
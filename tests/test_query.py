@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+Query answers off the search indexes against a scan of the tree.
+
+Run the tests with: python -m unittest discover -s tests
+'''
+
+import unittest
+
+from udevdiscover.query import Query
+
+from synthetic import synthetic_finder
+
+PATTERNS = [
+    'name:sd[abcd]', 'name:sd[abcd]1', 'name:sd[!a]', 'name:sd[a-c]?',
+    'name:sd?', 'name:sd*', 'name:0000:00:0[ab].0', 'name:usb[]1]',
+    'label:*hub*', 'label:mass [s]torage*', 'label:[!u]sb*', 'label:usb*',
+    'path:*usb*', 'path:*/0000:00:0[!a-c].0', 'vendor:intel*',
+    'vendor:keyboard 1?', 'driver:usb*', 'driver:[ux]*', '-name:sd[!x]*',
+    'label:*controller* OR name:sd[ab]',
+]
+
+# Values needing quotes, written back by str()
+QUOTED_PATTERNS = [
+    'label:"mass storage*"', 'label:"usb device" name:usb*',
+    'prop:ID_MODEL="usb \\"hub\\""', 'label~"/input dev/i"',
+    '"input device"', 'label:"-x"', 'label:"OR" OR name:"a b"',
+    '-label:"pci bridge"',
+]
+
+class QueryIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.finder = synthetic_finder(300)
+        self.indexed = synthetic_finder(300)
+        self.indexed.set_search_index()
+
+    def assertSelectsAsScan(self, finder, text):
+        query = Query(text)
+        expected = set([path for path, dev in
+            finder.devices_tree.iteritems() if query.match(dev)])
+        self.assertEqual(set(query.select(finder)), expected, text)
+
+    def test_scan(self):
+        for text in PATTERNS:
+            self.assertSelectsAsScan(self.finder, text)
+
+    def test_index(self):
+        for text in PATTERNS:
+            self.assertSelectsAsScan(self.indexed, text)
+
+    def test_str(self):
+        for text in PATTERNS + QUOTED_PATTERNS:
+            query = Query(text)
+            again = Query(str(query))
+            self.assertEqual(str(again), str(query), text)
+            self.assertEqual(set(again.select(self.finder)),
+                set(query.select(self.finder)), text)
+
+    def test_quoted(self):
+        self.assertEqual(str(Query('label:"mass storage*"')),
+            'label:"mass storage*"')
+        self.assertEqual(
+            len(Query('label:"mass storage*"').select(self.finder)), 30)
+
+    def test_classes(self):
+        query = Query('name:sd[abcd]')
+        self.assertEqual(sorted([self.indexed.devices_tree[path].name
+            for path in query.select(self.indexed)]),
+            ['sda', 'sdb', 'sdc', 'sdd'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,7 +20,9 @@
 # 
 ###
 
-from devicefinder import DeviceFinder, get_subsystems
+from devicefinder import DeviceFinder, get_subsystems, get_subsystem_counts
+from match import DeviceMatch
+from query import IncrementalSearch, Query, QueryError
 
 import gettext
 import locale
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+Backends a DeviceFinder gets its devices from. Whatever the backend, the
+devices are handed over as objects with the read-only GUdev.Device API,
+so the udevdiscover.device classes can wrap any of them.
+'''
+
+BACKENDS = ('gudev', 'sysfs', 'fixture')
+
+class Backend(object):
+    '''The interface every backend implements'''
+
+    name = None
+
+    def monitor(self, subsystems, callback):
+        '''
+        Call callback(backend, action, device) on every uevent of the given
+        subsystems (all of them if empty)
+        '''
+        raise NotImplementedError
+
+    def query(self):
+        '''Enumerate every device on the system'''
+        raise NotImplementedError
+
+    def query_by_sysfs_path(self, sysfs_path):
+        '''Get the device at sysfs_path, or None if there is no such one'''
+        raise NotImplementedError
+
+def get_backend(backend='gudev'):
+    '''Get a new backend by name, or backend itself if it already is one'''
+
+    if not isinstance(backend, basestring):
+        return backend
+    elif backend == 'gudev':
+        from gudev import GUdevBackend
+        return GUdevBackend()
+    elif backend == 'sysfs':
+        from sysfs import SysfsBackend
+        return SysfsBackend()
+    elif backend == 'fixture':
+        from fixture import FixtureBackend
+        return FixtureBackend()
+    else:
+        raise ValueError, 'Unknown backend %s' % backend
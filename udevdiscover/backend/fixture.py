@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+An in-memory backend holding a recorded or synthetic device tree, which
+uevents are injected into by hand. It makes scans, searches and event
+storms measurable without the hardware they would take.
+'''
+
+import json
+import os
+
+from udevdiscover.backend import Backend
+from sysfs import SysfsDevice
+
+SYSFS_DEVICES = '/sys/devices'
+
+class FixtureBackend(Backend):
+    name = 'fixture'
+
+    def __init__(self, devices=()):
+        self.devices = {}
+        self.subsystems = None
+        self.callback = None
+
+        for fields in devices:
+            self.add_device(**fields)
+
+    def monitor(self, subsystems, callback):
+        self.subsystems = subsystems and set(subsystems) or None
+        self.callback = callback
+
+    def query(self):
+        return [self.devices[path] for path in sorted(self.devices.keys())]
+
+    def query_by_sysfs_path(self, sysfs_path):
+        return self.devices.get(sysfs_path)
+
+    def add_device(self, path, subsystem=None, driver=None, props=None,
+            tags=(), symlinks=()):
+        '''Add a device to the tree, below its closest known ancestor'''
+
+        props = dict(props or {})
+        props['DEVPATH'] = path[len('/sys'):]
+        if subsystem:
+            props['SUBSYSTEM'] = subsystem
+        if driver:
+            props['DRIVER'] = driver
+
+        parent_path = os.path.dirname(path)
+        while len(parent_path) > len(SYSFS_DEVICES) and \
+                not self.devices.has_key(parent_path):
+            parent_path = os.path.dirname(parent_path)
+        if not self.devices.has_key(parent_path):
+            parent_path = None
+
+        dev = SysfsDevice(self, path, subsystem, driver, props, list(tags),
+            list(symlinks), parent_path)
+        self.devices[path] = dev
+        return dev
+
+    def remove_device(self, path):
+        return self.devices.pop(path, None)
+
+    def move_device(self, old_path, new_path):
+        '''Move the device at old_path, along with its subtree, to new_path'''
+
+        prefix = old_path + '/'
+        moved = sorted([path for path in self.devices 
+            if path == old_path or path.startswith(prefix)])
+
+        for path in moved:
+            old_dev = self.devices.pop(path)
+            props = dict(old_dev.props)
+            props.pop('DEVPATH_OLD', None)
+            if path == old_path:
+                props['DEVPATH_OLD'] = props['DEVPATH']
+            self.add_device(new_path + path[len(old_path):], 
+                old_dev.subsystem, old_dev.driver, props, old_dev.tags,
+                old_dev.symlinks)
+
+        return self.devices.get(new_path)
+
+    def inject(self, action, path, **fields):
+        '''
+        Deliver a synthetic uevent to the monitoring callback. 'add' takes
+        the add_device() fields of the new device; 'move' the old_path
+        the device was at; 'change' and the rest take props to update,
+        and driver or tags to replace. 'unbind' clears the driver.
+        '''
+        if action == 'add':
+            dev = self.add_device(path, **fields)
+        elif action == 'remove':
+            dev = self.remove_device(path)
+        elif action == 'move':
+            dev = self.move_device(fields['old_path'], path)
+        elif self.devices.has_key(path):
+            old_dev = self.devices[path]
+            props = dict(old_dev.props)
+            props.update(fields.get('props', {}))
+            driver = fields.get('driver', old_dev.driver)
+            if action == 'unbind':
+                driver = None
+            dev = self.add_device(path, old_dev.subsystem, driver, props,
+                fields.get('tags', old_dev.tags), old_dev.symlinks)
+        else:
+            dev = None
+
+        if dev is None or self.callback is None:
+            return dev
+        if self.subsystems is None or dev.subsystem in self.subsystems:
+            self.callback(self, action, dev)
+        return dev
+
+    def load(self, filename):
+        '''Add the devices recorded on filename by record()'''
+        for fields in json.load(open(filename)):
+            self.add_device(**fields)
+
+    def generate(self, pci=0, usb=0, block=0, net=0, input=0):
+        '''
+        Add a synthetic tree with the given number of plain PCI devices,
+        USB devices, disks (with a partition each), network interfaces and
+        input devices
+        '''
+        root = os.path.join(SYSFS_DEVICES, 'pci0000:00')
+        slots = iter(xrange(1, 0x10000))
+        minors = iter(xrange(64, 0x10000))
+        self.add_device(root)
+
+        def pci_device(pci_class, driver=None):
+            slot = slots.next()
+            path = os.path.join(root, '0000:%02x:%02x.0' % divmod(slot, 0x20))
+            self.add_device(path, 'pci', driver, {
+                'PCI_CLASS': pci_class,
+                'PCI_ID': '8086:%04X' % slot,
+                'MODALIAS': 'pci:v00008086d00001234sv00000000sd00000000'
+                    'bc%ssc%si%s' % (pci_class[:-4].zfill(2).upper(),
+                    pci_class[-4:-2], pci_class[-2:]),
+            })
+            return path
+
+        for index in xrange(pci):
+            pci_device('60400', 'pcieport')
+
+        for index in xrange(net):
+            path = os.path.join(pci_device('20000', 'e1000e'), 'net',
+                'eth%d' % index)
+            self.add_device(path, 'net', None, {'INTERFACE': 'eth%d' % index,
+                'IFINDEX': str(index + 2), 'ID_VENDOR_FROM_DATABASE': 'Intel',
+                'ID_MODEL_FROM_DATABASE': 'Ethernet Controller %d' % index})
+
+        if usb:
+            hub = os.path.join(pci_device('c0330', 'xhci_hcd'), 'usb1')
+            self.add_device(hub, 'usb', 'usb', {'DEVTYPE': 'usb_device',
+                'TYPE': '9/0/1', 'PRODUCT': '1d6b/2/0'})
+        for index in xrange(usb):
+            path = os.path.join(hub, '1-%d' % (index + 1))
+            self.add_device(path, 'usb', 'usb', {'DEVTYPE': 'usb_device',
+                'TYPE': '0/0/0', 'PRODUCT': '46d/c52b/1200',
+                'ID_VENDOR': 'Logitech', 'ID_MODEL': 'Receiver %d' % index})
+            self.add_device(os.path.join(path, '1-%d:1.0' % (index + 1)),
+                'usb', 'usbhid', {'DEVTYPE': 'usb_interface',
+                'INTERFACE': '3/1/2'})
+
+        if block:
+            host = pci_device('10601', 'ahci')
+        for index in xrange(block):
+            name = 'sd%s' % ''.join([chr(ord('a') + digit) for digit in
+                base26(index)])
+            disk = os.path.join(host, 'ata%d' % (index + 1),
+                'host%d' % index, 'target%d:0:0' % index,
+                '%d:0:0:0' % index)
+            self.add_device(disk, 'scsi', 'sd', {'DEVTYPE': 'scsi_device'})
+            disk = os.path.join(disk, 'block', name)
+            self.add_device(disk, 'block', None, {'DEVTYPE': 'disk',
+                'DEVNAME': '/dev/' + name, 'MAJOR': '8', 'MINOR':
+                str(index * 16), 'ID_BUS': 'ata', 'ID_MODEL': 'Disk %d' % index,
+                'ID_VENDOR': 'ATA'}, ['systemd'])
+            self.add_device(os.path.join(disk, name + '1'), 'block', None, {
+                'DEVTYPE': 'partition', 'DEVNAME': '/dev/%s1' % name,
+                'MAJOR': '8', 'MINOR': str(index * 16 + 1),
+                'ID_FS_TYPE': 'ext4', 'ID_FS_USAGE': 'filesystem'},
+                ['systemd'])
+
+        for index in xrange(input):
+            path = os.path.join(SYSFS_DEVICES, 'platform', 'i8042',
+                'serio%d' % index, 'input', 'input%d' % index)
+            self.add_device(path, 'input', None, {'NAME': '"Keyboard %d"' % 
+                index, 'ID_INPUT': '1', 'ID_INPUT_KEYBOARD': '1'})
+            self.add_device(os.path.join(path, 'event%d' % index), 'input',
+                None, {'DEVNAME': '/dev/input/event%d' % index, 'MAJOR': '13',
+                'MINOR': str(minors.next()), 'ID_INPUT': '1',
+                'ID_INPUT_KEYBOARD': '1'})
+
+def base26(number):
+    '''The digits naming the disk number on sda, sdb, ..., sdaa, ...'''
+    digits = [number % 26]
+    number = number / 26
+    while number:
+        number -= 1
+        digits.insert(0, number % 26)
+        number = number / 26
+    return digits
+
+def record(backend, filename):
+    '''Save the devices of backend for FixtureBackend.load()'''
+
+    devices = []
+    for dev in backend.query():
+        props = dict([(key, dev.get_property(key))
+            for key in dev.get_property_keys()])
+        devices.append({
+            'path': dev.get_sysfs_path(),
+            'subsystem': dev.get_subsystem(),
+            'driver': dev.get_driver(),
+            'props': props,
+            'tags': list(dev.get_tags()),
+            'symlinks': list(dev.get_device_file_symlinks()),
+        })
+
+    json.dump(devices, open(filename, 'w'), indent=1)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+# (http://mednis.info/use-girequire_versiongtk-30-before-import.html)
+import gi
+gi.require_version("GUdev", "1.0")
+from gi.repository import GUdev
+
+from udevdiscover.backend import Backend
+
+class GUdevBackend(Backend):
+    '''Devices and uevents straight from libudev, through GUdev'''
+
+    name = 'gudev'
+
+    def __init__(self):
+        self.client = None
+        self.subsystems = None
+        self.handler_id = None
+
+    def monitor(self, subsystems, callback):
+        if self.handler_id is not None:
+            if subsystems == self.subsystems:
+                return
+            self.client.disconnect(self.handler_id)
+
+        self.client = GUdev.Client.new(subsystems)
+        self.subsystems = subsystems
+        self.handler_id = self.client.connect('uevent', callback)
+
+    def query(self):
+        if self.client is None:
+            self.client = GUdev.Client.new('')
+        return self.client.query_by_subsystem(None)
+
+    def query_by_sysfs_path(self, sysfs_path):
+        if self.client is None:
+            self.client = GUdev.Client.new('')
+        return self.client.query_by_sysfs_path(sysfs_path)
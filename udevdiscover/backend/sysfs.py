@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+A backend reading sysfs and the udev database files straight away, so a
+whole enumeration is a plain directory walk and every later access to the
+devices is a dict lookup instead of a GObject introspection call.
+'''
+
+import os
+import re
+
+from udevdiscover.backend import Backend
+
+SYSFS_DIR = '/sys'
+UDEV_DATA_DIR = '/run/udev/data'
+DEV_DIR = '/dev'
+
+number_regex = re.compile('[0-9]+$')
+
+# Imported once needed, as FixtureBackend shares SysfsDevice and does
+# without libudev
+GUdev = None
+
+def import_gudev():
+    global GUdev
+
+    if GUdev is None:
+        # (http://mednis.info/use-girequire_versiongtk-30-before-import.html)
+        import gi
+        gi.require_version("GUdev", "1.0")
+        from gi.repository import GUdev as gudev
+        GUdev = gudev
+    return GUdev
+
+def read_link_name(path):
+    try:
+        return os.path.basename(os.readlink(path))
+    except OSError:
+        return None
+
+def read_uevent_file(sysfs_path):
+    props = {}
+    try:
+        uevent_file = open(os.path.join(sysfs_path, 'uevent'))
+    except IOError:
+        return props
+
+    for line in uevent_file.read().splitlines():
+        key, sep, value = line.partition('=')
+        if sep: props[key] = value
+    uevent_file.close()
+
+    return props
+
+def read_udev_data_file(filename):
+    '''Get the properties, tags and symlinks of an udev database entry'''
+
+    props, tags, symlinks = {}, [], []
+    try:
+        data_file = open(filename)
+    except IOError:
+        return props, tags, symlinks
+
+    for line in data_file.read().splitlines():
+        kind, value = line[:2], line[2:]
+        if kind == 'E:':
+            key, sep, value = value.partition('=')
+            if sep: props[key] = value
+        elif kind == 'G:':
+            tags.append(value)
+        elif kind == 'S:':
+            symlinks.append(os.path.join(DEV_DIR, value))
+        elif kind == 'I:':
+            props['USEC_INITIALIZED'] = value
+    data_file.close()
+
+    return props, tags, symlinks
+
+class SysfsDevice(object):
+    '''
+    A snapshot of a device taken from sysfs and the udev database, with the
+    read-only API of GUdev.Device
+    '''
+
+    def __init__(self, backend, sysfs_path, subsystem, driver, props, tags,
+            symlinks, parent_path):
+        self.backend = backend
+        self.sysfs_path = sysfs_path
+        self.subsystem = subsystem
+        self.driver = driver
+        self.props = props
+        self.tags = tags
+        self.symlinks = symlinks
+        self.parent_path = parent_path
+        self.name = os.path.basename(sysfs_path)
+
+    def get_sysfs_path(self):
+        return self.sysfs_path
+
+    def get_subsystem(self):
+        return self.subsystem
+
+    def get_name(self):
+        return self.name
+
+    def get_number(self):
+        number = number_regex.search(self.name)
+        return number and number.group(0) or None
+
+    def get_devtype(self):
+        return self.props.get('DEVTYPE')
+
+    def get_driver(self):
+        return self.driver
+
+    def get_action(self):
+        return None
+
+    def get_seqnum(self):
+        return 0
+
+    def get_parent(self):
+        if self.parent_path is None:
+            return None
+        return self.backend.query_by_sysfs_path(self.parent_path)
+
+    def get_device_type(self):
+        import_gudev()
+        if not self.props.has_key('MAJOR'):
+            return GUdev.DeviceType.NONE
+        elif self.subsystem == 'block':
+            return GUdev.DeviceType.BLOCK
+        else:
+            return GUdev.DeviceType.CHAR
+
+    def get_device_number(self):
+        if not self.props.has_key('MAJOR'):
+            return 0
+        return os.makedev(int(self.props['MAJOR']), int(self.props['MINOR']))
+
+    def get_device_file(self):
+        return self.props.get('DEVNAME')
+
+    def get_device_file_symlinks(self):
+        return self.symlinks
+
+    def get_property_keys(self):
+        return self.props.keys()
+
+    def get_property(self, key):
+        return self.props.get(key)
+
+    def has_property(self, key):
+        return self.props.has_key(key)
+
+    def get_tags(self):
+        return self.tags
+
+class SysfsBackend(Backend):
+    '''
+    Devices enumerated by walking sysfs/devices in bulk. The few uevents
+    coming later are still received through libudev.
+
+    sysfs_dir and udev_data_dir may point to a copy of them recorded on
+    another host, as long as no uevents are expected.
+    '''
+
+    name = 'sysfs'
+
+    def __init__(self, sysfs_dir=SYSFS_DIR, udev_data_dir=UDEV_DATA_DIR):
+        self.devices_dir = os.path.join(sysfs_dir, 'devices')
+        self.udev_data_dir = udev_data_dir
+        self.devices = {}
+        self.uevents = None
+
+    def monitor(self, subsystems, callback):
+        if self.uevents is None:
+            from gudev import GUdevBackend
+            self.uevents = GUdevBackend()
+        self.uevents.monitor(subsystems, callback)
+
+    def query(self):
+        '''Enumerate every device on the system, parents first'''
+
+        try:
+            udev_data = set(os.listdir(self.udev_data_dir))
+        except OSError:
+            udev_data = set()
+
+        self.devices = {}
+        for dirpath, dirnames, filenames in os.walk(self.devices_dir):
+            if 'uevent' in filenames:
+                self.devices[dirpath] = self.read_device(dirpath, udev_data)
+
+        return [self.devices[path] for path in sorted(self.devices.keys())]
+
+    def query_by_sysfs_path(self, sysfs_path):
+        if not self.devices.has_key(sysfs_path):
+            if not os.path.exists(os.path.join(sysfs_path, 'uevent')):
+                return None
+            self.devices[sysfs_path] = self.read_device(sysfs_path)
+
+        return self.devices[sysfs_path]
+
+    def read_device(self, sysfs_path, udev_data=None):
+        subsystem = read_link_name(os.path.join(sysfs_path, 'subsystem'))
+        driver = read_link_name(os.path.join(sysfs_path, 'driver'))
+
+        props = read_uevent_file(sysfs_path)
+        props['DEVPATH'] = sysfs_path[len(os.path.dirname(self.devices_dir)):]
+        if subsystem:
+            props['SUBSYSTEM'] = subsystem
+        if props.has_key('DEVNAME'):
+            props['DEVNAME'] = os.path.join(DEV_DIR, props['DEVNAME'])
+
+        tags, symlinks = [], []
+        data_id = self.__udev_data_id(sysfs_path, subsystem, props)
+        if udev_data is None or data_id in udev_data:
+            data_props, tags, symlinks = read_udev_data_file(
+                os.path.join(self.udev_data_dir, data_id))
+            props.update(data_props)
+            if symlinks:
+                props['DEVLINKS'] = ' '.join(symlinks)
+            if tags:
+                props['TAGS'] = ':%s:' % ':'.join(tags)
+
+        return SysfsDevice(self, sysfs_path, subsystem, driver, props, tags,
+            symlinks, self.__parent_path(sysfs_path))
+
+    def __udev_data_id(self, sysfs_path, subsystem, props):
+        # The same naming libudev uses for the files of its database
+        if props.has_key('MAJOR'):
+            return '%s%s:%s' % (subsystem == 'block' and 'b' or 'c',
+                props['MAJOR'], props.get('MINOR'))
+        elif props.has_key('IFINDEX'):
+            return 'n%s' % props['IFINDEX']
+        else:
+            return '+%s:%s' % (subsystem, os.path.basename(sysfs_path))
+
+    def __parent_path(self, sysfs_path):
+        path = os.path.dirname(sysfs_path)
+        while len(path) > len(self.devices_dir):
+            if self.devices.has_key(path) or \
+                    os.path.exists(os.path.join(path, 'uevent')):
+                return path
+            path = os.path.dirname(path)
+
+        return None
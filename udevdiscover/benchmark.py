@@ -0,0 +1,742 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+Rough performance measurements against the devices present on this host.
+
+Run them with: python -m udevdiscover.benchmark [name ...]
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import gi
+gi.require_version("GUdev", "1.0")
+from gi.repository import GObject, GUdev
+
+import udevdiscover.device
+import udevdiscover.device.registry
+from udevdiscover import caching, hwdb, namecache
+from udevdiscover.device import pci, usb
+import udevdiscover.device.snapshot
+from udevdiscover.backend import BACKENDS, get_backend
+from udevdiscover.backend import fixture
+from udevdiscover.backend.fixture import FixtureBackend
+from udevdiscover.devicefinder import DeviceFinder, STORES
+from udevdiscover.match import DeviceMatch
+from udevdiscover.query import IncrementalSearch, Query
+
+# The GUI default choice
+SUBSYSTEMS = ['pci', 'usb', 'net', 'power_supply', 'block', 'sound', 'input',
+    'serio', 'platform', 'drm', 'video4linux', 'rfkill', 'bluetooth', 'leds',
+    'dvb']
+
+def best_of(repeat, func, *args, **kwargs):
+    '''Call func repeat times, returning the best time and the last result'''
+
+    best, result = None, None
+    for i in range(repeat):
+        start = time.time()
+        result = func(*args, **kwargs)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, result
+
+def bench_scan(subsystems='', repeat=3):
+    '''Scan time of flat mode against parent tree mode'''
+
+    def scan(parent_tree):
+        # A fresh finder each time, as its identity map would hide the cost
+        finder = DeviceFinder()
+        finder.scan_subsystems(subsystems, parent_tree)
+        return finder
+
+    for label, parent_tree in ('flat', False), ('parent tree', True):
+        elapsed, finder = best_of(repeat, scan, parent_tree)
+        print '%-12s %6d devices %10.2f ms' % (label, 
+            len(finder.get_devices()), elapsed * 1000)
+
+def bench_enumerate(subsystems=SUBSYSTEMS, repeat=3):
+    '''One query per subsystem against a single filtered enumeration'''
+
+    def query_each():
+        client = GUdev.Client.new(subsystems)
+        return sum([len(client.query_by_subsystem(subsystem))
+            for subsystem in subsystems])
+
+    elapsed, count = best_of(repeat, query_each)
+    print '%-12s %6d devices %10.2f ms' % ('per query', count, elapsed * 1000)
+
+    def scan():
+        finder = DeviceFinder()
+        finder.scan_subsystems(subsystems)
+        return finder
+
+    elapsed, finder = best_of(repeat, scan)
+    print '%-12s %6d devices %10.2f ms' % ('single pass',
+        len(finder.get_devices()), elapsed * 1000)
+    for phase in 'enumerate', 'filter', 'build':
+        print '  %-10s %20.2f ms' % (phase, finder.scan_timings[phase] * 1000)
+
+def bench_backends(search_string='usb', repeat=3):
+    '''Full scan and search through each backend'''
+
+    def scan(backend):
+        finder = DeviceFinder(backend=backend)
+        finder.scan_subsystems('', True)
+        return finder
+
+    def search(finder):
+        return len([dev for dev in finder.get_devices()
+            if udevdiscover.device.match_string(dev, search_string)])
+
+    for name in BACKENDS:
+        backend = name
+        if name == 'fixture':
+            # Empty until given a tree, so it gets the one of this host
+            backend = FixtureBackend()
+            recording = tempfile.mkstemp(suffix='.json')[1]
+            try:
+                fixture.record(get_backend('gudev'), recording)
+                backend.load(recording)
+            finally:
+                os.unlink(recording)
+
+        scan_elapsed, finder = best_of(repeat, scan, backend)
+        search_elapsed, found = best_of(repeat, search, finder)
+        print '%-12s %6d devices %10.2f ms scan %10.2f ms search (%d found)' % (
+            name, len(finder.get_devices()), scan_elapsed * 1000,
+            search_elapsed * 1000, found)
+
+def synthetic_backend(count):
+    '''A FixtureBackend with a synthetic tree of about count devices'''
+
+    backend = FixtureBackend()
+    share = max(count / 10, 1)
+    backend.generate(pci=share, usb=share, block=share, net=share * 2,
+        input=share)
+    return backend
+
+def synthetic_finder(count, parent_tree=True, keep_handles=True):
+    '''A DeviceFinder scanning a synthetic tree of about count devices'''
+
+    finder = DeviceFinder(backend=synthetic_backend(count),
+        keep_handles=keep_handles)
+    finder.scan_subsystems('', parent_tree)
+    return finder
+
+def bench_synthetic(counts=(1000, 10000), search_string='usb', repeat=3):
+    '''Scan, search and a hotplug storm on synthetic trees'''
+
+    for count in counts:
+        elapsed, finder = best_of(repeat, synthetic_finder, count)
+        print '%6d devices %10.2f ms scan' % (len(finder.get_devices()),
+            elapsed * 1000)
+
+        elapsed, found = best_of(repeat, lambda: len([dev for dev in
+            finder.get_devices() if udevdiscover.device.match_string(dev,
+            search_string)]))
+        print '%6d devices %10.2f ms search' % (len(finder.get_devices()),
+            elapsed * 1000)
+
+        def storm():
+            paths = ['/sys/devices/virtual/misc/storm%d' % index
+                for index in xrange(count / 10)]
+            for path in paths:
+                finder.backend.inject('add', path, subsystem='misc')
+            for path in paths:
+                finder.backend.inject('change', path, props={'SEQNUM': '1'})
+            for path in reversed(paths):
+                finder.backend.inject('remove', path)
+            return len(paths) * 3
+
+        elapsed, events = best_of(repeat, storm)
+        print '%6d events  %10.2f ms storm' % (events, elapsed * 1000)
+
+def bench_unplug(count=1000, repeat=3):
+    '''Unplugging a USB hub with count devices, event by event or at once'''
+
+    def unplug(parent_tree, leaf_first):
+        backend = FixtureBackend()
+        backend.generate(usb=count)
+        finder = DeviceFinder(backend=backend)
+        finder.scan_subsystems('', parent_tree)
+
+        hub = [path for path in finder.get_devices_tree() 
+            if path.endswith('/usb1')][0]
+        paths = [path for path in finder.get_devices_tree()
+            if path.startswith(hub + '/')]
+        if leaf_first:
+            paths.reverse()
+        else:
+            paths = []
+
+        start = time.time()
+        for path in paths + [hub]:
+            backend.inject('remove', path)
+        return time.time() - start, len(paths) + 1, len(finder.get_devices())
+
+    for parent_tree in True, False:
+        for label, leaf_first in ('leaf first', True), ('hub only', False):
+            elapsed, events, left = min([unplug(parent_tree, leaf_first)
+                for index in xrange(repeat)])
+            print '%-11s %-10s %6d events %10.2f ms (%d devices left)' % (
+                parent_tree and 'parent tree' or 'flat', label, events,
+                elapsed * 1000, left)
+
+def bench_classify(count=10000, repeat=3):
+    '''Device classes told, and Devices built, per second'''
+
+    gudevices = synthetic_backend(count).query()
+    registry = udevdiscover.device.registry.registry
+
+    def resolve():
+        return [registry.resolve(gudevice) for gudevice in gudevices]
+
+    def classify():
+        return [udevdiscover.device.get_device_object(gudevice)
+            for gudevice in gudevices]
+
+    for label, func in ('resolve', resolve), ('classify', classify):
+        elapsed, found = best_of(repeat, func)
+        print '%-9s %6d devices %10.2f ms %12d devices/s' % (label,
+            len(found), elapsed * 1000, len(found) / max(elapsed, 1e-9))
+
+def legacy_short_long_names(names, unknown, klass, subclass, protocol):
+    '''The class code lookup ClassCodeIndex replaced, as a reference'''
+
+    key = [klass]
+    klasses = [k for k in names.keys() if k[0] == klass]
+    if not klasses:
+        return unknown
+
+    if not [s for s in klasses if s[1] == subclass]:
+        key.append(-1)
+    else:
+        key.append(subclass)
+
+    if not (key[0], key[1], protocol) in klasses:
+        key.append(-1)
+    else:
+        key.append(protocol)
+
+    if names.has_key(tuple(key)):
+        return names[tuple(key)]
+    else:
+        return names[(klass, -1, -1)]
+
+def class_code_space(names, exhaustive=False):
+    '''
+    Every (class, subclass, protocol) code, or unless exhaustive just one
+    of each kind the lookup can tell apart: those on the table, plus one
+    missing subclass and protocol for each class.
+    '''
+    if exhaustive:
+        for klass in xrange(256):
+            for subclass in xrange(256):
+                for protocol in xrange(256):
+                    yield klass, subclass, protocol
+        return
+
+    for klass in xrange(256):
+        subclasses = set([k[1] for k in names if k[0] == klass])
+        protocols = set([k[2] for k in names if k[0] == klass])
+        for subclass in subclasses | set([min(set(xrange(256)) - subclasses)]):
+            for protocol in protocols | set([min(set(xrange(256)) - protocols)]):
+                yield klass, subclass, protocol
+
+def bench_classcodes(exhaustive=False, repeat=3):
+    '''PCI and USB class code names, checked and timed against the old lookup'''
+
+    for label, names, unknown, index in (
+            ('pci', pci.pci_class_names, (pci.UNKNOWN_NAME, pci.UNKNOWN_NAME),
+                pci.pci_class_index),
+            ('usb', usb.usb_class_names, (None, None), usb.usb_class_index)):
+        codes = list(class_code_space(names, exhaustive))
+        mismatches = [code for code in codes if index.lookup(*code) != 
+            legacy_short_long_names(names, unknown, *code)]
+
+        legacy_elapsed, found = best_of(repeat, lambda: [
+            legacy_short_long_names(names, unknown, *code) for code in codes])
+        elapsed, found = best_of(repeat, lambda: [index.lookup(*code) 
+            for code in codes])
+        print '%s %8d codes %6d mismatches %10.2f ms old %10.2f ms index' % (
+            label, len(codes), len(mismatches), legacy_elapsed * 1000,
+            elapsed * 1000)
+
+def deep_sizeof(obj, seen=None):
+    '''Bytes taken by obj and everything reachable from it, once each'''
+
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, type):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.iteritems():
+            size += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+
+    if hasattr(obj, '__dict__'):
+        size += deep_sizeof(obj.__dict__, seen)
+    for attr in getattr(type(obj), '__slots__', ()):
+        if hasattr(obj, attr):
+            size += deep_sizeof(getattr(obj, attr), seen)
+    return size
+
+def bench_memory(count=1000):
+    '''Bytes per device with and without the backend handles'''
+
+    for keep_handles in (True, False):
+        finder = synthetic_finder(count, keep_handles=keep_handles)
+        devices = finder.get_devices()
+        seen = set()
+        # Devices reach each other through the identity map
+        seen.add(id(finder.identity_map))
+        total = sum(deep_sizeof(dev, seen) for dev in devices)
+        print '%-14s %6d devices %10d bytes %8d bytes/device' % (
+            keep_handles and 'with handles' or 'snapshots only',
+            len(devices), total, total / max(len(devices), 1))
+
+    stats = udevdiscover.device.snapshot.strings.get_stats()
+    print 'interned %(size)d strings, %(hits)d hits: %(bytes_saved)d bytes ' \
+        'saved, %(table_bytes)d bytes of table' % stats
+
+def bench_columnar(count=20000, repeat=3):
+    '''Scan, memory and a filter on dict and columnar device stores'''
+
+    backend = synthetic_backend(count)
+    # Disks, as in "block devices whose driver is sd"
+    match = DeviceMatch(['scsi'], drivers=['sd'])
+
+    for store in STORES:
+        def scan():
+            finder = DeviceFinder(backend=backend, keep_handles=False,
+                store=store)
+            finder.scan_subsystems('', True)
+            return finder
+
+        elapsed, finder = best_of(repeat, scan)
+        tree = finder.get_devices_tree()
+        if store == 'columnar':
+            size = deep_sizeof([getattr(tree, name) for name in ('strings',
+                'string_ids', 'rows', 'paths', 'subsystems', 'devtypes',
+                'drivers', 'parents', 'tags', 'symlinks', 'prop_starts',
+                'prop_counts', 'prop_rows', 'prop_keys', 'prop_values')])
+        else:
+            seen = set([id(finder.identity_map)])
+            size = sum([deep_sizeof(dev, seen) for dev in tree.itervalues()])
+        print '%-9s %6d devices %10.2f ms scan %10d bytes/device' % (store,
+            len(tree), elapsed * 1000, size / max(len(tree), 1))
+
+        elapsed, found = best_of(repeat, finder.select, match)
+        print '%-9s %6d found   %10.2f ms select' % (store, len(found),
+            elapsed * 1000)
+
+def synthetic_hwdb_sources(directory, vendors=200, models=50):
+    '''
+    PCI and USB vendor and model .hwdb sources written to directory, laid
+    out as the ones udev generates from pci.ids and usb.ids
+    '''
+
+    for name, vendor_pattern, model_pattern in (
+            ('20-pci-vendor-model.hwdb', 'pci:v%08X*', 'pci:v%08Xd%08X*'),
+            ('20-usb-vendor-model.hwdb', 'usb:v%04Xp*', 'usb:v%04Xp%04X*')):
+        source = open(os.path.join(directory, name), 'w')
+        source.write('# Synthetic vendor and model names\n\n')
+        for vendor in range(0x1000, 0x1000 + vendors):
+            source.write(vendor_pattern % vendor + '\n')
+            source.write(' ID_VENDOR_FROM_DATABASE=Vendor %04x\n\n' % vendor)
+            for model in range(models):
+                source.write(model_pattern % (vendor, model) + '\n')
+                source.write(' ID_MODEL_FROM_DATABASE=Model %04x:%04x\n\n' % (
+                    vendor, model))
+        source.close()
+
+def compile_hwdb(text_hwdb, path):
+    '''
+    Write the entries of a TextHwdb to path as a hwdb.bin, the way
+    systemd-hwdb lays out its trie, to have one on hosts without it
+    '''
+
+    root = ({}, [])
+    for entries in text_hwdb.entries.itervalues():
+        for pattern, props, (priority, line_number) in entries:
+            node = root
+            for char in pattern:
+                node = node[0].setdefault(char, ({}, []))
+            for key, value in sorted(props.iteritems()):
+                node[1].append((' ' + key, value, priority, line_number))
+
+    strings = {}
+    string_data = ['\0']
+    strings_len = [1]
+    def add_string(string):
+        if not strings.has_key(string):
+            strings[string] = hwdb.HEADER.size + strings_len[0]
+            string_data.append(string + '\0')
+            strings_len[0] += len(string) + 1
+        return strings[string]
+
+    # Nodes are written children first, so every offset is known
+    node_data = []
+    def write_node(node, offset):
+        prefix = []
+        while len(node[0]) == 1 and not node[1]:
+            prefix_char, node = node[0].items()[0]
+            prefix.append(prefix_char)
+
+        children = [(ord(char), write_node(child, offset))
+            for char, child in sorted(node[0].iteritems())]
+        record = [hwdb.NODE.pack(prefix and add_string(''.join(prefix)) or 0,
+            len(children), len(node[1]))]
+        record.extend([hwdb.CHILD.pack(code, child_off)
+            for code, child_off in children])
+        record.extend([hwdb.VALUE2.pack(add_string(key), add_string(value),
+            0, line_number, priority)
+            for key, value, priority, line_number in node[1]])
+
+        node_off = offset[0]
+        node_data.append(''.join(record))
+        offset[0] += len(node_data[-1])
+        return node_off
+
+    # Lay the strings out first, then place the nodes behind them
+    write_node(root, [0])
+    strings_len = strings_len[0]
+    del node_data[:]
+    root_off = write_node(root, [hwdb.HEADER.size + strings_len])
+    nodes_len = sum(map(len, node_data))
+
+    hwdb_file = open(path, 'wb')
+    hwdb_file.write(hwdb.HEADER.pack(hwdb.SIGNATURE, 1,
+        hwdb.HEADER.size + strings_len + nodes_len, hwdb.HEADER.size,
+        hwdb.NODE.size, hwdb.CHILD.size, hwdb.VALUE2.size, root_off,
+        nodes_len, strings_len))
+    hwdb_file.write(''.join(string_data))
+    hwdb_file.write(''.join(node_data))
+    hwdb_file.close()
+
+def bench_hwdb(vendors=200, models=50, count=10000, repeat=3):
+    '''Vendor and model names from hwdb.bin and the .hwdb sources'''
+
+    directory = tempfile.mkdtemp()
+    try:
+        synthetic_hwdb_sources(directory, vendors, models)
+        elapsed, text_hwdb = best_of(repeat, hwdb.TextHwdb,
+            hwdb.get_hwdb_sources([directory]))
+        print 'text   %8.2f ms load' % (elapsed * 1000)
+
+        path = os.path.join(directory, 'hwdb.bin')
+        compile_hwdb(text_hwdb, path)
+        elapsed, bin_hwdb = best_of(repeat, hwdb.BinaryHwdb, path)
+        print 'binary %8.2f ms open, %d bytes' % (elapsed * 1000,
+            os.path.getsize(path))
+
+        # As many modaliases as devices in a large scan, some unknown
+        modaliases = []
+        for i in range(count):
+            vendor = 0x1000 + i % (vendors + 10)
+            model = i % (models + 5)
+            if i % 2:
+                modaliases.append('pci:v%08Xd%08Xsv00000000sd00000000'
+                    'bc02sc00i00' % (vendor, model))
+            else:
+                modaliases.append('usb:v%04Xp%04X' % (vendor, model))
+
+        mismatches = [modalias for modalias in modaliases
+            if bin_hwdb.lookup(modalias) != text_hwdb.lookup(modalias)]
+        named = [modalias for modalias in modaliases
+            if bin_hwdb.lookup(modalias).has_key('ID_MODEL_FROM_DATABASE')]
+        print '%d modaliases, %d named, %d mismatches' % (len(modaliases),
+            len(named), len(mismatches))
+
+        for label, hwdb_db in (('text', text_hwdb), ('binary', bin_hwdb)):
+            elapsed, found = best_of(repeat, lambda: [hwdb_db.lookup(modalias)
+                for modalias in modaliases])
+            print '%-6s %8.2f ms lookups %8.2f us/device' % (label,
+                elapsed * 1000, elapsed * 1e6 / len(modaliases))
+        bin_hwdb.close()
+    finally:
+        shutil.rmtree(directory)
+
+def bench_namecache(vendors=200, models=50, count=2000, repeat=3):
+    '''Cold and warm starts resolving names, with and without a cache file'''
+
+    directory = tempfile.mkdtemp()
+    try:
+        synthetic_hwdb_sources(directory, vendors, models)
+        sources = hwdb.get_hwdb_sources([directory])
+        mtime = hwdb.get_hwdb_mtime([], [directory])
+        path = os.path.join(directory, 'hwdb-names')
+        keys = ['usb:v%04Xp%04X' % (0x1000 + i % vendors, i % models)
+            for i in range(count)]
+
+        def start(mtime):
+            # As a new process would: the database is only opened on a miss
+            text_hwdb = []
+            def resolve(modalias):
+                if not text_hwdb:
+                    text_hwdb.append(hwdb.TextHwdb(sources))
+                props = text_hwdb[0].lookup(modalias)
+                return props.get('ID_VENDOR_FROM_DATABASE'), \
+                    props.get('ID_MODEL_FROM_DATABASE')
+
+            cache = namecache.NameCache(path, mtime, resolve)
+            for key in keys:
+                cache.get(key)
+            cache.save()
+            return cache
+
+        for label, cache_mtime in (('cold', mtime), ('warm', mtime),
+                ('stale', mtime + 1), ('warm', mtime + 1)):
+            if label == 'cold' and os.path.exists(path):
+                os.remove(path)
+            elapsed, cache = best_of(label in ('warm',) and repeat or 1,
+                start, cache_mtime)
+            print '%-5s %8.2f ms %5d hits %5d misses %6d bytes on disk' % (
+                label, elapsed * 1000, cache.hits, cache.misses,
+                os.path.getsize(path))
+    finally:
+        shutil.rmtree(directory)
+
+def bench_enrichment(count=10000, search_string='logitech', threads=2):
+    '''Main loop time of a first search, with and without enrichment'''
+
+    for enrich in (False, True):
+        finder = synthetic_finder(count)
+        devices = list(finder.get_devices())
+
+        elapsed = 0.0
+        if enrich:
+            start = time.time()
+            finder.set_enrichment(threads, interval=10)
+            # Stand in for the main loop until every device is delivered
+            delivered = []
+            finder.connect('enriched', lambda finder, devs:
+                delivered.extend(devs))
+            context = GObject.MainContext.default()
+            while len(delivered) < len(devices):
+                context.iteration(True)
+            elapsed = time.time() - start
+            finder.set_enrichment(0)
+
+        search, found = best_of(1, lambda: [dev for dev in devices
+            if udevdiscover.device.match_string(dev, search_string)])
+        print '%-10s %6d devices %8.2f ms enriching %8.2f ms first search' % (
+            enrich and 'enriched' or 'lazy', len(devices), elapsed * 1000,
+            search * 1000)
+
+def bench_churn(cycles=2000, repeat=1):
+    '''Memoized values kept across a hotplug churn of USB sticks'''
+
+    backend = synthetic_backend(100)
+    finder = DeviceFinder(backend=backend)
+    finder.scan_subsystems('', True)
+    host = [dev.path for dev in finder.get_devices()
+        if dev.subsystem == 'usb'][0]
+
+    def churn():
+        for cycle in range(cycles):
+            stick = '%s/stick%d' % (host, cycle)
+            disk = stick + '/block/sdz%d' % cycle
+            backend.inject('add', stick, subsystem='scsi', driver='sd')
+            backend.inject('add', disk, subsystem='block',
+                props={'DEVTYPE': 'disk', 'ID_BUS': 'usb'})
+            finder.get_devices_tree()[disk].get_enriched('nice_label')
+            backend.inject('remove', stick)
+
+    elapsed, unused = best_of(repeat, churn)
+    print '%d plug cycles in %.2f ms' % (cycles, elapsed * 1000)
+    for name, stats in sorted(caching.get_cache_stats().iteritems()):
+        stats['name'] = name
+        print '%(name)-50s %(size)5d kept %(hits)6d hits %(misses)6d ' \
+            'misses %(evictions)6d evicted' % stats
+
+def legacy_match_string(device, search_string):
+    '''The per field match_string SearchText replaced, as a reference'''
+
+    match = False
+    if (search_string in device.nice_label.lower()) or \
+            (search_string in device.device.get_name().lower()) or \
+            (hasattr(device, 'vendor_name') and device.vendor_name and \
+                search_string in device.vendor_name.lower()) or \
+            (hasattr(device, 'model_name') and device.model_name and \
+                search_string in device.model_name.lower()):
+        match = True
+    for key, val in device.get_info():
+        if search_string in str(val).lower():
+            match = True
+    for key, val in device.get_props().items():
+        if search_string in str(key).lower() or \
+                search_string in str(val).lower():
+            match = True
+    if hasattr(device, 'get_summary'):
+        for key, val in device.get_summary():
+            if search_string in str(val).lower():
+                match = True
+    return match
+
+def bench_search(counts=(1000, 10000, 50000), search_strings=('usb',
+        'logitech', 'sdz', 'nothing-like-it'), repeat=3):
+    '''Search latency against device count, per field and on SearchText'''
+
+    for count in counts:
+        devices = list(synthetic_finder(count).get_devices())
+
+        mismatches = 0
+        for search_string in search_strings:
+            mismatches += len([dev for dev in devices
+                if legacy_match_string(dev, search_string) !=
+                    udevdiscover.device.match_string(dev, search_string)])
+
+        for search_string in search_strings:
+            legacy, found = best_of(repeat, lambda: [dev for dev in devices
+                if legacy_match_string(dev, search_string)])
+            for dev in devices:
+                dev.update(dev.device)
+            build, found = best_of(1, lambda: [dev for dev in devices
+                if udevdiscover.device.match_string(dev, search_string)])
+            elapsed, found = best_of(repeat, lambda: [dev for dev in devices
+                if udevdiscover.device.match_string(dev, search_string)])
+            print '%6d devices %-16r %5d found %9.2f ms per field ' \
+                '%9.2f ms first %9.2f ms blob' % (len(devices),
+                search_string, len(found), legacy * 1000, build * 1000,
+                elapsed * 1000)
+        print '%6d devices %d mismatches' % (len(devices), mismatches)
+
+def bench_searchindex(counts=(10000, 100000), search_strings=('usb',
+        'logitech', 'sdz', '1-1', 'nothing-like-it'), repeat=3):
+    '''Substring search through the trigram index against a linear scan'''
+
+    for count in counts:
+        finder = synthetic_finder(count, keep_handles=False)
+        devices = list(finder.get_devices())
+        for dev in devices:
+            dev.get_search_text()
+
+        finder.set_search_index()
+        elapsed, unused = best_of(1, finder.search_index.flush)
+        stats = finder.search_index.get_stats()
+        stats['size'] = deep_sizeof([finder.search_index.postings,
+            finder.search_index.text_paths, finder.search_index.texts])
+        stats['elapsed'] = elapsed * 1000
+        print '%(devices)6d devices %(elapsed)9.2f ms index %(texts)7d texts ' \
+            '%(grams)6d grams %(postings)8d postings %(size)10d bytes' % stats
+
+        for search_string in search_strings:
+            linear, found = best_of(repeat, lambda: [dev for dev in devices
+                if udevdiscover.device.match_string(dev, search_string)])
+            elapsed, indexed = best_of(repeat, finder.search, search_string)
+            print '%6d devices %-18r %6d found %9.2f ms scan %9.3f ms ' \
+                'index%s' % (len(devices), search_string, len(indexed),
+                linear * 1000, elapsed * 1000, len(found) != len(indexed) and
+                ' MISMATCH' or '')
+
+def bench_query(counts=(10000, 100000), queries=('subsystem:block driver:sd*',
+        'subsystem:usb -prop:ID_VENDOR', 'prop:ID_BUS=usb', 'vendor~/^Logi/',
+        'label:*hub* OR driver:sdz', '-subsystem:usb'), repeat=3):
+    '''Queries answered from the field and trigram indexes against scans'''
+
+    for count in counts:
+        finder = synthetic_finder(count, keep_handles=False)
+        devices = list(finder.get_devices())
+        for dev in devices:
+            dev.get_search_text()
+
+        finder.set_search_index()
+        elapsed, unused = best_of(1, finder.field_index.flush)
+        finder.search_index.flush()
+        stats = finder.field_index.get_stats()
+        stats['elapsed'] = elapsed * 1000
+        print '%(devices)6d devices %(elapsed)9.2f ms index %(subsystem)4d ' \
+            'subsystems %(driver)4d drivers %(prop)5d keys' % stats
+
+        for text in queries:
+            query = Query(text)
+            linear, found = best_of(repeat, lambda: [dev for dev in devices
+                if query.match(dev)])
+            elapsed, indexed = best_of(repeat, finder.query, query)
+            print '%6d devices %-32r %6d found %9.2f ms scan %9.3f ms ' \
+                'query%s' % (len(devices), text, len(indexed), linear * 1000,
+                elapsed * 1000, len(found) != len(indexed) and ' MISMATCH'
+                or '')
+        print finder.explain(queries[0])
+
+def bench_narrowing(counts=(10000, 100000), typed='usb logitech sub',
+        repeat=3):
+    '''Typing a search key by key, narrowing the last results or afresh'''
+
+    for count in counts:
+        finder = synthetic_finder(count, keep_handles=False)
+        for dev in finder.get_devices():
+            dev.get_search_text()
+        finder.set_search_index()
+        finder.search_index.flush()
+        finder.field_index.flush()
+        queries = [Query(typed[:end]) for end in xrange(1, len(typed) + 1)]
+
+        def type_in(search):
+            return [len(search(query)) for query in queries]
+
+        fresh, found = best_of(repeat, type_in, lambda query:
+            query.select(finder))
+        incremental = IncrementalSearch(finder)
+        narrowed, narrowed_found = best_of(repeat, type_in, incremental.search)
+        print '%6d devices %3d keys %9.2f ms afresh %9.2f ms narrowing, ' \
+            '%d refined%s' % (count, len(queries), fresh * 1000,
+            narrowed * 1000, incremental.refined / repeat,
+            found != narrowed_found and ' MISMATCH' or '')
+
+BENCHMARKS = {
+    'narrowing': bench_narrowing,
+    'query': bench_query,
+    'searchindex': bench_searchindex,
+    'search': bench_search,
+    'churn': bench_churn,
+    'enrichment': bench_enrichment,
+    'namecache': bench_namecache,
+    'hwdb': bench_hwdb,
+    'classcodes': bench_classcodes,
+    'classify': bench_classify,
+    'unplug': bench_unplug,
+    'columnar': bench_columnar,
+    'memory': bench_memory,
+    'synthetic': bench_synthetic,
+    'backends': bench_backends,
+    'enumerate': bench_enumerate,
+    'scan': bench_scan,
+}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or sorted(BENCHMARKS.keys()):
+        print '== %s: %s' % (name, BENCHMARKS[name].__doc__)
+        BENCHMARKS[name]()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+Bounded memoization, for the monitor to run for weeks of hotplug churn.
+'''
+
+from collections import OrderedDict
+import functools
+import threading
+import time
+
+DEFAULT_MAXSIZE = 1024
+
+# The caches with entries tied to sysfs paths, see evict_path()
+path_caches = []
+caches = []
+
+class memoized(object):
+    """Decorator that caches a function's return value each time it is called.
+    If called later with the same arguments, the cached value is returned, and
+    not re-evaluated.
+
+    At most maxsize values are kept, the least recently used going first,
+    and none for longer than ttl seconds if given. path, if given, tells
+    the sysfs path of the device a call is about from its arguments, so
+    evict_path() can drop the values of devices gone or changed.
+    """
+    def __init__(self, func, maxsize=DEFAULT_MAXSIZE, ttl=None, path=None):
+        self.func = func
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.cache = OrderedDict()
+        # The keys of the cache by path, if path is given
+        self.paths = {}
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+        functools.update_wrapper(self, func)
+        caches.append(self)
+        if path is not None:
+            path_caches.append(self)
+
+    def __call__(self, *args):
+        try:
+            with self.lock:
+                value, expires = self.cache.pop(args)
+                if expires is not None and expires < time.time():
+                    self.__unindex(args)
+                    self.expirations += 1
+                else:
+                    self.cache[args] = (value, expires)
+                    self.hits += 1
+                    return value
+        except KeyError:
+            pass
+        except TypeError:
+            # uncachable -- for instance, passing a list as an argument.
+            # Better to not cache than to blow up entirely.
+            return self.func(*args)
+
+        # Not under the lock, as it may be slow or call back
+        value = self.func(*args)
+        expires = self.ttl is not None and time.time() + self.ttl or None
+
+        with self.lock:
+            self.misses += 1
+            self.cache[args] = (value, expires)
+            if self.path is not None:
+                self.paths.setdefault(self.path(*args), set()).add(args)
+            while len(self.cache) > self.maxsize:
+                self.__unindex(self.cache.popitem(last=False)[0])
+                self.evictions += 1
+        return value
+
+    def __unindex(self, args):
+        if self.path is not None:
+            path = self.path(*args)
+            keys = self.paths.get(path)
+            if keys is not None:
+                keys.discard(args)
+                if not keys:
+                    del self.paths[path]
+
+    def __repr__(self):
+        """Return the function's docstring."""
+        return self.func.__doc__
+
+    def __get__(self, obj, objtype):
+        """Support instance methods."""
+        if obj is None:
+            return self
+        return functools.partial(self.__call__, obj)
+
+    def evict_path(self, path):
+        '''Drop the values of the device at path'''
+        with self.lock:
+            for args in self.paths.pop(path, ()):
+                if self.cache.pop(args, None) is not None:
+                    self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.paths.clear()
+
+    def get_stats(self):
+        return {'size': len(self.cache), 'maxsize': self.maxsize,
+            'hits': self.hits, 'misses': self.misses,
+            'evictions': self.evictions, 'expirations': self.expirations}
+
+def memoize(maxsize=DEFAULT_MAXSIZE, ttl=None, path=None):
+    '''A memoized decorator with other limits than the default ones'''
+    def decorator(func):
+        return memoized(func, maxsize, ttl, path)
+    return decorator
+
+def evict_path(path):
+    '''Drop the memoized values of the device at path, as it went or changed'''
+    for cache in path_caches:
+        cache.evict_path(path)
+
+def get_cache_stats():
+    '''The stats of every memoized function, by qualified name'''
+    return dict(('%s.%s' % (cache.func.__module__, cache.func.__name__),
+        cache.get_stats()) for cache in caches)
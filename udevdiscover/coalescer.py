@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+from gi.repository import GObject
+
+# Collapsed action for each (first action, last action) seen on a path
+MERGED_ACTIONS = {
+    ('add', 'add'): 'add',
+    ('add', 'change'): 'add',
+    ('add', 'bind'): 'add',
+    ('add', 'unbind'): 'add',
+    ('add', 'online'): 'add',
+    ('add', 'offline'): 'add',
+    ('add', 'remove'): None,
+    ('change', 'add'): 'change',
+    ('change', 'change'): 'change',
+    ('change', 'remove'): 'remove',
+    ('remove', 'add'): 'change',
+    ('remove', 'change'): 'change',
+    ('remove', 'remove'): 'remove',
+    ('unbind', 'unbind'): 'unbind',
+    ('unbind', 'remove'): 'remove',
+}
+
+class EventCoalescer(object):
+    '''
+    Collects uevents for up to window milliseconds or max_events events,
+    whatever comes first, and hands them to flush_callback as a list of
+    (action, gudevice) with the redundant ones per sysfs path collapsed:
+    add -> change -> change is a single add, add -> bind is a single add,
+    add -> remove is nothing.
+    Actions out of MERGED_ACTIONS are kept as they came.
+    '''
+
+    def __init__(self, flush_callback, window=100, max_events=0):
+        self.flush_callback = flush_callback
+        self.window = window
+        self.max_events = max_events
+        self.pending = []
+        self.open = {}
+        self.pending_count = 0
+        self.timeout_id = None
+
+        self.received = 0
+        self.merged = 0
+        self.flushes = 0
+
+    def push(self, action, gudevice):
+        self.received += 1
+        self.pending_count += 1
+        path = gudevice.get_sysfs_path()
+
+        entry = self.open.get(path)
+        if entry is not None and MERGED_ACTIONS.has_key((entry[0], action)):
+            entry[1:] = [action, gudevice]
+        else:
+            entry = [action, action, gudevice]
+            self.pending.append(entry)
+            # Later events of path can't be merged across one that isn't
+            if MERGED_ACTIONS.has_key((action, action)):
+                self.open[path] = entry
+            elif self.open.has_key(path):
+                del(self.open[path])
+
+        if self.max_events and self.pending_count >= self.max_events:
+            self.flush()
+        elif self.timeout_id is None:
+            self.timeout_id = GObject.timeout_add(self.window, self.__timeout)
+
+    def __timeout(self):
+        self.timeout_id = None
+        self.flush()
+        return False
+
+    def flush(self):
+        if self.timeout_id is not None:
+            GObject.source_remove(self.timeout_id)
+            self.timeout_id = None
+
+        events = []
+        for first_action, last_action, gudevice in self.pending:
+            action = MERGED_ACTIONS.get((first_action, last_action), 
+                last_action)
+            if action is not None:
+                events.append((action, gudevice))
+
+        self.merged += self.pending_count - len(events)
+        self.pending = []
+        self.open = {}
+        self.pending_count = 0
+
+        if events:
+            self.flushes += 1
+            self.flush_callback(events)
+
+    def get_stats(self):
+        return {
+            'received': self.received,
+            'merged': self.merged,
+            'flushes': self.flushes,
+            'pending': self.pending_count,
+        }
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+A device store laid out column by column, for trees of many thousands of
+devices where a Python object with a dict per device would not scale.
+'''
+
+from array import array
+from collections import ValuesView
+from itertools import izip
+import weakref
+
+import device
+from backend.sysfs import SysfsDevice
+from identitymap import DeviceIdentityMap
+
+# The id of a missing string, and the path of a removed row
+NONE = -1
+
+# Dead rows tolerated before compacting, besides as many as the live ones
+MIN_GARBAGE = 1024
+
+def scan_column(column, value_id):
+    '''The rows of column holding value_id, searched for over its bytes'''
+
+    itemsize = column.itemsize
+    needle = array(column.typecode, [value_id]).tostring()
+    data = column.tostring()
+
+    rows = []
+    position = data.find(needle)
+    while position != -1:
+        if position % itemsize:
+            position = data.find(needle, position + 1)
+        else:
+            rows.append(position / itemsize)
+            position = data.find(needle, position + itemsize)
+    return rows
+
+def get_parent_path(gudevice):
+    if hasattr(gudevice, 'get_parent_path'):
+        return gudevice.get_parent_path()
+
+    parent_path = getattr(gudevice, 'parent_path', False)
+    if parent_path is False:
+        parent = gudevice.get_parent()
+        parent_path = parent and parent.get_sysfs_path() or None
+    return parent_path
+
+class ColumnarStore(DeviceIdentityMap):
+    '''
+    The devices tree of a DeviceFinder kept as arrays of ids into one
+    table of strings: a row per device with its path, subsystem, devtype,
+    driver, parent path, tags and symlinks, plus (row, key, value) arrays
+    for the properties. Rows keep the insertion order, parents first.
+
+    It is used as an ordered dict of Devices keyed by sysfs path, but they
+    are only built from their row when asked for, and shared for as long
+    as anyone holds them. So the store is their identity map too. Parents
+    out of the store are not known.
+
+    Devices built out of a row have just the row as their handle. If
+    keep_handles is False, they drop it, and so do the Devices stored.
+    '''
+
+    def __init__(self, factory=device.get_device_object, keep_handles=True):
+        DeviceIdentityMap.__init__(self, factory, keep_handles)
+        self.devices = weakref.WeakValueDictionary()
+        self.clear()
+
+    def clear(self):
+        self.devices.clear()
+        self.strings = []
+        self.string_ids = {}
+        self.rows = {}
+        self.paths = array('i')
+        self.subsystems = array('i')
+        self.devtypes = array('i')
+        self.drivers = array('i')
+        self.parents = array('i')
+        self.tags = array('i')
+        self.symlinks = array('i')
+        self.prop_starts = array('i')
+        self.prop_counts = array('i')
+        self.prop_rows = array('i')
+        self.prop_keys = array('i')
+        self.prop_values = array('i')
+        self.garbage = 0
+        self.materialized = 0
+
+    def intern(self, string):
+        '''The id of string on the strings table'''
+        if string is None:
+            return NONE
+
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def __columns(self):
+        return (self.paths, self.subsystems, self.devtypes, self.drivers,
+            self.parents, self.tags, self.symlinks)
+
+    # Mapping of the rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, path):
+        return path in self.rows
+
+    def has_key(self, path):
+        return path in self.rows
+
+    def __iter__(self):
+        strings = self.strings
+        for path_id in self.paths:
+            if path_id != NONE:
+                yield strings[path_id]
+
+    def __reversed__(self):
+        strings = self.strings
+        for path_id in reversed(self.paths):
+            if path_id != NONE:
+                yield strings[path_id]
+
+    iterkeys = __iter__
+
+    def keys(self):
+        return list(self)
+
+    def itervalues(self):
+        for path in self:
+            yield self[path]
+
+    def iteritems(self):
+        for path in self:
+            yield path, self[path]
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def viewvalues(self):
+        return ValuesView(self)
+
+    def __getitem__(self, path):
+        if not path in self.rows:
+            raise KeyError, path
+        return self.get(path)
+
+    def __setitem__(self, path, value):
+        '''
+        Store a Device, or just the row of a GUdev.Device (or the like) to
+        be wrapped on the first access
+        '''
+        if isinstance(value, device.Device):
+            self.__write(path, value.device)
+            value.identity_map = self
+            if not self.keep_handles:
+                value.release_handle()
+            self.devices[path] = value
+        else:
+            self.__write(path, value)
+            self.devices.pop(path, None)
+
+    def __delitem__(self, path):
+        row = self.rows.pop(path)
+        self.paths[row] = NONE
+        self.__drop_props(row)
+        self.garbage += 1
+
+        if self.garbage > len(self.rows) + MIN_GARBAGE:
+            self.compact()
+
+    def pop(self, path, *default):
+        if not path in self.rows:
+            if default:
+                return default[0]
+            raise KeyError, path
+
+        dev = self.get(path)
+        del self[path]
+        return dev
+
+    # Identity map of the Devices
+
+    def get(self, path, default=None):
+        '''The Device at path, on the store or still held by someone'''
+        dev = self.devices.get(path)
+        if dev is not None:
+            return dev
+
+        row = self.rows.get(path)
+        if row is None:
+            return default
+
+        dev = self.factory(self.get_row(row))
+        dev.identity_map = self
+        if not self.keep_handles:
+            dev.release_handle()
+        self.devices[path] = dev
+        self.materialized += 1
+        return dev
+
+    def update(self, gudevice, new_dev=None):
+        # Hold the Device built out of the row, which has the old state,
+        # as only held ones stay in self.devices for the base update to find
+        dev = self.get(gudevice.get_sysfs_path())
+        result = DeviceIdentityMap.update(self, gudevice, new_dev)
+        del dev
+        return result
+
+    def evict(self, path):
+        dev = self.get(path)
+        self.devices.pop(path, None)
+        if dev is not None:
+            self.evictions += 1
+        return dev
+
+    def get_stats(self):
+        stats = DeviceIdentityMap.get_stats(self)
+        stats.update({
+            'size': len(self.rows),
+            'held': len(self.devices),
+            'materialized': self.materialized,
+            'strings': len(self.strings),
+            'properties': len(self.prop_keys),
+            'garbage': self.garbage,
+            'bytes': sum([column.itemsize * len(column) for column in
+                self.__columns() + (self.prop_starts, self.prop_counts,
+                self.prop_rows, self.prop_keys, self.prop_values)]),
+        })
+        return stats
+
+    # Rows
+
+    def get_row(self, row):
+        '''The device at row, as a GUdev.Device alike'''
+        strings = self.strings
+
+        def string(string_id):
+            if string_id == NONE:
+                return None
+            return strings[string_id]
+
+        start = self.prop_starts[row]
+        end = start + self.prop_counts[row]
+        props = dict([(strings[key], strings[value]) for key, value in
+            izip(self.prop_keys[start:end], self.prop_values[start:end])])
+
+        return SysfsDevice(self, strings[self.paths[row]],
+            string(self.subsystems[row]), string(self.drivers[row]), props,
+            [tag for tag in strings[self.tags[row]].split(':') if tag],
+            strings[self.symlinks[row]].split(), 
+            string(self.parents[row]))
+
+    def query_by_sysfs_path(self, sysfs_path):
+        '''Backend API for the parents of the rows'''
+        row = self.rows.get(sysfs_path)
+        if row is None:
+            return None
+        return self.get_row(row)
+
+    def __write(self, path, gudevice):
+        intern = self.intern
+        values = (intern(path), intern(gudevice.get_subsystem()),
+            intern(gudevice.get_devtype()), intern(gudevice.get_driver()),
+            intern(get_parent_path(gudevice)),
+            intern(':'.join(gudevice.get_tags() or ())),
+            intern(' '.join(gudevice.get_device_file_symlinks() or ())))
+
+        row = self.rows.get(path)
+        if row is None:
+            row = self.rows[path] = len(self.paths)
+            for column, value in izip(self.__columns(), values):
+                column.append(value)
+            self.prop_starts.append(0)
+            self.prop_counts.append(0)
+        else:
+            for column, value in izip(self.__columns(), values):
+                column[row] = value
+            self.__drop_props(row)
+
+        keys = gudevice.get_property_keys()
+        self.prop_starts[row] = len(self.prop_keys)
+        self.prop_counts[row] = len(keys)
+        for key in keys:
+            self.prop_rows.append(row)
+            self.prop_keys.append(intern(key))
+            self.prop_values.append(intern(gudevice.get_property(key)))
+
+    def __drop_props(self, row):
+        start = self.prop_starts[row]
+        for prop in xrange(start, start + self.prop_counts[row]):
+            self.prop_rows[prop] = NONE
+        self.prop_counts[row] = 0
+
+    def compact(self):
+        '''Drop the rows, properties and strings no longer in use'''
+        strings = []
+        string_ids = {}
+        new_ids = {NONE: NONE}
+
+        def keep(string_id):
+            new_id = new_ids.get(string_id)
+            if new_id is None:
+                string = self.strings[string_id]
+                new_id = new_ids[string_id] = string_ids[string] = len(strings)
+                strings.append(string)
+            return new_id
+
+        live = [row for row, path_id in enumerate(self.paths)
+            if path_id != NONE]
+        columns = [array('i', [keep(column[row]) for row in live])
+            for column in self.__columns()]
+
+        prop_starts, prop_counts = array('i'), array('i')
+        prop_rows, prop_keys, prop_values = array('i'), array('i'), array('i')
+        for new_row, row in enumerate(live):
+            start = self.prop_starts[row]
+            end = start + self.prop_counts[row]
+            prop_starts.append(len(prop_keys))
+            prop_counts.append(end - start)
+            prop_rows.extend([new_row] * (end - start))
+            prop_keys.extend([keep(key) for key in self.prop_keys[start:end]])
+            prop_values.extend([keep(value) for value in
+                self.prop_values[start:end]])
+
+        (self.paths, self.subsystems, self.devtypes, self.drivers,
+            self.parents, self.tags, self.symlinks) = columns
+        self.prop_starts, self.prop_counts = prop_starts, prop_counts
+        self.prop_rows, self.prop_keys = prop_rows, prop_keys
+        self.prop_values = prop_values
+        self.strings, self.string_ids = strings, string_ids
+        self.rows = dict((strings[path_id], row) for row, path_id in
+            enumerate(self.paths))
+        self.garbage = 0
+
+    # Filters
+
+    def select(self, match):
+        '''
+        The paths, in order, of the devices meeting match, a DeviceMatch. 
+        Every criterion but the tags is a scan for an id over one column.
+        '''
+        rows = None
+
+        for column, values in ((self.subsystems, match.subsystems),
+                (self.devtypes, match.devtypes), 
+                (self.drivers, match.drivers)):
+            if values is not None:
+                rows = self.__narrow(rows, self.__scan(column, values))
+
+        for key, value in (match.properties or {}).iteritems():
+            key_id = self.string_ids.get(key)
+            if key_id is None:
+                return []
+
+            if value is None:
+                props = self.__scan(self.prop_keys, [key])
+            else:
+                props = [prop for prop in self.__scan(self.prop_values,
+                    [value]) if self.prop_keys[prop] == key_id]
+            rows = self.__narrow(rows, [self.prop_rows[prop] 
+                for prop in props])
+
+        if rows is None:
+            rows = xrange(len(self.paths))
+        else:
+            rows = sorted(rows)
+
+        paths = self.paths
+        strings = self.strings
+        if match.tags is None:
+            return [strings[paths[row]] for row in rows if paths[row] != NONE]
+
+        return [strings[paths[row]] for row in rows if paths[row] != NONE and
+            not match.tags.isdisjoint(strings[self.tags[row]].split(':'))]
+
+    def __scan(self, column, values):
+        rows = set()
+        for value in values:
+            if value is None:
+                value_id = NONE
+            else:
+                value_id = self.string_ids.get(value)
+                if value_id is None:
+                    continue
+            rows.update(scan_column(column, value_id))
+        return rows
+
+    def __narrow(self, rows, found):
+        found = set(found)
+        found.discard(NONE)
+        if rows is None:
+            return found
+        return rows & found
@@ -22,43 +22,100 @@
 # Authors : J. Félix Ontañón <fontanon@emergya.es>
 # 
 
+import bisect
+
 # (http://mednis.info/use-girequire_versiongtk-30-before-import.html)
 import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import GUdev
 
+from udevdiscover.device.registry import registry as device_registry
+from udevdiscover.device.snapshot import DeviceSnapshot
+
+# Device fields slow enough to be worth reading out of the main loop
+ENRICHED_ATTRS = ('nice_label', 'vendor_name', 'model_name')
+
 def match_string(device, search_string):
     """ Finds the search string around the device """
+    return search_string in device.get_search_text().text
 
-    match = False
-
-    # Matching device name, nice_label, vendor and model
-    if (search_string in device.nice_label.lower()) or \
-            (search_string in device.device.get_name().lower()) or \
-            (hasattr(device, 'vendor_name') and device.vendor_name and \
-                search_string in device.vendor_name.lower()) or \
-            (hasattr(device, 'model_name') and device.model_name and \
-                search_string in device.model_name.lower()):
-        match = True
-
-    # Matching udev device static info
-    for key, val in device.get_info():
-        if search_string in str(val).lower():
-            match = True
-
-    # Matching udev device properties
-    for key, val in device.get_props().items():
-        if search_string in str(key).lower() or \
-                search_string in str(val).lower():
-            match = True
-
-    # Matching optional udevdiscover device summary info
-    if hasattr(device, 'get_summary'):
-        for key, val in device.get_summary():
-            if search_string in str(val).lower():
-                match = True
+def get_search_fields(device, values=None):
+    """ The (field, text) pairs a device is searched by """
+
+    def enriched(attr):
+        if values is not None and values.has_key(attr):
+            return values[attr]
+        return device.get_enriched(attr)
+
+    # Device name, nice_label, vendor and model
+    fields = [('label', enriched('nice_label')),
+        ('name', device.device.get_name() or '')]
+    for field, attr in (('vendor', 'vendor_name'), ('model', 'model_name')):
+        if enriched(attr):
+            fields.append((field, enriched(attr)))
 
-    return match
+    # udev device static info
+    fields.extend(device.get_info())
+
+    # udev device properties, by key and by value
+    for key, val in device.get_props().iteritems():
+        fields.append(('property:' + key, key))
+        fields.append(('property:' + key, val))
+
+    # Optional udevdiscover device summary info
+    if hasattr(device, 'get_summary'):
+        fields.extend([('summary:' + key, val)
+            for key, val in device.get_summary()])
+
+    return fields
+
+class SearchText(object):
+    '''
+    The fields a device is searched by, lowercased and joined into a single
+    string, so that matching it is a single substring scan. offsets keeps
+    where each field starts, to tell which ones a match fell in.
+    '''
+
+    __slots__ = ('text', 'offsets', 'fields')
+
+    # Never typed into a search
+    SEPARATOR = '\0'
+
+    def __init__(self, fields):
+        texts = []
+        self.offsets = []
+        self.fields = []
+
+        offset = 0
+        for field, val in fields:
+            text = str(val)
+            texts.append(text)
+            self.offsets.append(offset)
+            self.fields.append(field)
+            offset += len(text) + len(self.SEPARATOR)
+
+        # Lowered at once, which keeps the offsets of byte strings
+        self.text = self.SEPARATOR.join(texts).lower()
+
+    def __contains__(self, search_string):
+        return search_string in self.text
+
+    def field_at(self, offset):
+        return self.fields[bisect.bisect_right(self.offsets, offset) - 1]
+
+    def get_matched_fields(self, search_string):
+        '''The fields search_string is found in, in order and once each'''
+        matched = []
+        offset = self.text.find(search_string)
+        while offset != -1:
+            index = bisect.bisect_right(self.offsets, offset) - 1
+            if not self.fields[index] in matched:
+                matched.append(self.fields[index])
+            # On to the next field
+            if index + 1 == len(self.offsets):
+                break
+            offset = self.text.find(search_string, self.offsets[index + 1])
+        return matched
 
 def find_differences(dev_a, dev_b):
     # Matching device info differences
@@ -96,40 +153,8 @@ def find_differences(dev_a, dev_b):
         yield ('new', 'property', key, dev_b_props[key])
 
 def get_device_object(device):
-    subsys = device.get_subsystem()
-
-    if subsys == 'usb':
-        import usb
-        return usb.get_device_object(device)
-    elif subsys == 'pci':
-        import pci 
-        return pci.get_device_object(device)
-    elif subsys == 'block':
-        import block
-        return block.get_device_object(device)
-    elif subsys == 'scsi':
-        import scsi
-        return scsi.get_device_object(device)
-    elif subsys == 'input':
-        import input
-        return input.get_device_object(device)
-    elif subsys == 'net':
-        import net
-        return net.get_device_object(device)
-    elif subsys == 'power_supply':
-        import power_supply
-        return power_supply.get_device_object(device)
-    elif subsys == 'tty':
-        import tty
-        return tty.get_device_object(device)
-    elif subsys == 'sound':
-        import sound
-        return sound.get_device_object(device)
-    elif subsys == 'drm':
-        import drm
-        return drm.get_device_object(device)
-    else:
-        return Device(device)
+    '''A new Device of the right class for device, see DeviceRegistry'''
+    return device_registry.classify(device)
 
 class Device(object):
     '''A simple object representing a device.'''
@@ -141,13 +166,118 @@ class Device(object):
         GUdev.DeviceType.NONE: 'n/a'
     }
 
+    # Set by the DeviceIdentityMap owning this object, if any
+    identity_map = None
+    # The ENRICHED_ATTRS values, once read by enrich()
+    enrichment = None
+    _fingerprint = None
+    _path = None
+    _search_text = None
+    # The parent read off the handle, when not in the identity map
+    _parent = None
+
     def __init__(self, device):
         '''Create a new input device
             
         @type device: GUdev.Device
-        @param device: The device we are using
+        @param device: The device we are using, which is read just once
+            into a DeviceSnapshot
+        '''
+        self.device = DeviceSnapshot(device)
+
+    def update(self, device):
+        '''
+        Rebind this object to a fresher GUdev.Device of the same device,
+        whose path may have changed if it was moved
+        '''
+        self.__init__(device)
+        self.enrichment = None
+        self._fingerprint = None
+        self._path = None
+        self._search_text = None
+        self._parent = None
+
+    def adopt(self, other):
+        '''
+        Take the state of other, a Device of the same class built for a
+        fresher GUdev.Device of this device, with what was read off it
+        '''
+        identity_map = self.identity_map
+        self.__dict__.clear()
+        self.__dict__.update(other.__dict__)
+        self.identity_map = identity_map
+
+    def rebind(self, device):
+        '''
+        Take a fresher GUdev.Device of the same device, keeping what was
+        read off the previous one unless the device changed (see
+        fingerprint) or moved
+        '''
+        fingerprint, path = self.fingerprint, self.path
+        enrichment, search_text = self.enrichment, self._search_text
+        self.update(device)
+        if self.fingerprint == fingerprint and self.path == path:
+            self.enrichment = enrichment
+            self._search_text = search_text
+
+    def release_handle(self):
+        '''Stop holding the GUdev.Device, keeping just its snapshot'''
+        self.device = self.device.without_handle()
+
+    @property
+    def enriched(self):
+        return self.enrichment is not None
+
+    def read_enrichment(self):
+        '''
+        The ENRICHED_ATTRS this class has, read right now, and the
+        SearchText built from them as 'search_text'
+        '''
+        values = {}
+        for attr in ENRICHED_ATTRS:
+            try:
+                values[attr] = getattr(self, attr)
+            except Exception:
+                # Missing on this class, or failing to be read
+                pass
+        values['search_text'] = SearchText(get_search_fields(self, values))
+        return values
+
+    def enrich(self, values=None):
         '''
-        self.device = device
+        Keep the ENRICHED_ATTRS values, as read by read_enrichment() or
+        given in values, until the device is updated
+        '''
+        if values is None:
+            values = self.read_enrichment()
+        self.enrichment = values
+
+    def get_enriched(self, attr, default=None):
+        '''attr as it was when enriched, or else read right now'''
+        if self.enrichment is not None and self.enrichment.has_key(attr):
+            return self.enrichment[attr]
+        return getattr(self, attr, default)
+
+    def get_search_text(self):
+        '''
+        The SearchText of this device, built once, or taken from its
+        enrichment, until the device is updated
+        '''
+        if self._search_text is None:
+            search_text = self.get_enriched('search_text')
+            if search_text is None:
+                search_text = SearchText(get_search_fields(self))
+            self._search_text = search_text
+        return self._search_text
+
+    @property
+    def fingerprint(self):
+        '''A hash of the driver and udev properties, to spot changed devices'''
+        if self._fingerprint is None:
+            self._fingerprint = hash((self.device.get_driver(),
+                frozenset(self.device.props.iteritems())))
+
+        return self._fingerprint
 
     @property
     def nice_label(self):
@@ -163,11 +293,30 @@ class Device(object):
 
     @property
     def parent(self):
+        parent_path = self.device.get_parent_path()
+        if parent_path is None:
+            return None
+
+        if self.identity_map is not None:
+            parent = self.identity_map.get(parent_path)
+            if parent is not None:
+                return parent
+
+        if self._parent is not None:
+            return self._parent
+
+        # Without the handle, only the parents already known can be told
         parent_device = self.device.get_parent()
-        if parent_device:
-            return Device(parent_device)
-        else:
+        if not parent_device:
             return None
+        elif self.identity_map is not None:
+            # Not on the tree (e.g. flat listings), so not kept in the map
+            # either, as nothing would ever evict it, but held by this
+            # device so that it is classified just once
+            self._parent = get_device_object(parent_device)
+            return self._parent
+        else:
+            return Device(parent_device)
 
     def get_info(self):
         return (
@@ -187,11 +336,7 @@ class Device(object):
         )
 
     def get_props(self):
-        props = {}
-        for device_key in self.device.get_property_keys():
-            props[device_key] = self.device.get_property(device_key)
-
-        return props
+        return self.device.props.copy()
 
     @property
     def path(self):
@@ -200,7 +345,9 @@ class Device(object):
         @rtype: string
         @return: The sysfs path
         '''
-        return self.device.get_sysfs_path()
+        if self._path is None:
+            self._path = self.device.get_sysfs_path()
+        return self._path
 
     @property
     def subsystem(self):
@@ -210,7 +357,13 @@ class Device(object):
         return self.nice_label
 
     def __eq__(self, dev):
-        if dev == None:
+        if not isinstance(dev, Device):
             return False
         else:
             return self.path == dev.path
+
+    def __ne__(self, dev):
+        return not self.__eq__(dev)
+
+    def __hash__(self):
+        return hash(self.path)
@@ -23,6 +23,7 @@ __all__ = ['KB', 'MB', 'GB', 'BlockDevice', 'VolumeDevice', 'size_for_display']
 
 import os
 
+from udevdiscover.caching import memoize
 from udevdiscover.device import Device
 
 KB = 1024.0
@@ -39,30 +40,13 @@ def size_for_display(size):
     else:
         return "%.1f GB" % (size / GB)
 
-def get_device_object(gudevice):
-    devtype = gudevice.get_property('DEVTYPE')
-    bus = gudevice.get_property('ID_BUS')
+@memoize(path=lambda path: path)
+def get_volume_blocks(path):
+    size_file = os.path.join(path, 'size')
+    if os.path.exists(size_file):
+        return int(open(size_file).read())
+    return None
 
-    if devtype == 'disk':
-        if gudevice.get_property('ID_CDROM_MEDIA'):
-            from optical import OpticalDiskDevice
-            return OpticalDiskDevice(gudevice)
-        elif gudevice.get_property('ID_CDROM'):
-            from optical import OpticalDevice
-            return OpticalDevice(gudevice)
-        elif bus:
-            from disk import DiskDevice
-            return DiskDevice(gudevice)
-        else:
-            return BlockDevice(gudevice)
-            
-    elif devtype == 'partition':
-        from partition import PartitionDevice
-        return PartitionDevice(gudevice)
-
-    else:
-        return BlockDevice(gudevice)
-        
 class BlockDevice(Device):
     pass
 
@@ -74,6 +58,6 @@ class VolumeDevice(Device):
 
         self.size = None
 
-        size_file = os.path.join(self.path, 'size')
-        if os.path.exists(size_file):
-            self.size = int(open(size_file).read()) * self.BLOCK_SIZE
+        blocks = get_volume_blocks(self.path)
+        if blocks is not None:
+            self.size = blocks * self.BLOCK_SIZE
@@ -101,7 +101,7 @@ class OpticalDevice(DiskDevice):
     @property
     def capabilities(self):
         return [v for k, v in device_info_names.items() \
-            if self.get_props().has_key(k)]
+            if self.device.has_property(k)]
 
     @property
     def label(self):
@@ -143,4 +143,4 @@ class OpticalDiskDevice(OpticalDevice):
     @property
     def capabilities(self):
         return [(v, self.device.get_property(k)) for k, v in media_info_names.items() \
-            if self.get_props().has_key(k)]
+            if self.device.has_property(k)]
@@ -23,8 +23,11 @@ __all__ = ['PartitionDevice']
 
 import os
 
+from udevdiscover.caching import memoize
 from udevdiscover.device.block import *
 
+# Searching many partitions reads /proc/mounts just once a second
+@memoize(maxsize=256, ttl=1)
 def find_mount_point(devfile):
     for row in file('/proc/mounts'):
         cols = row.split()
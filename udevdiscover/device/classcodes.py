@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+class ClassCodeIndex(object):
+    '''
+    A table of names by (class, subclass, protocol) code, where -1 stands
+    for any subclass or protocol, compiled into nested dicts by class and
+    subclass. Which entry to fall back to for the codes missing in the
+    table is settled here once, so lookup() is just three dict gets.
+    '''
+
+    def __init__(self, names, unknown=None):
+        self.unknown = unknown
+        self.classes = {}
+
+        for (klass, subclass, protocol), value in names.iteritems():
+            class_default = names[(klass, -1, -1)]
+            subclasses = self.classes.setdefault(klass, {})
+            if not subclasses.has_key(subclass):
+                subclasses[subclass] = (names.get((klass, subclass, -1),
+                    class_default), {})
+            if protocol != -1:
+                subclasses[subclass][1][protocol] = value
+
+    def lookup(self, klass, subclass, protocol):
+        subclasses = self.classes.get(klass)
+        if subclasses is None:
+            return self.unknown
+
+        # An unknown subclass falls back to the entries of any subclass
+        default, protocols = subclasses.get(subclass) or subclasses[-1]
+        return protocols.get(protocol, default)
@@ -21,9 +21,6 @@
 
 from udevdiscover.device import Device
 
-def get_device_object(gudevice):
-    return DRMDevice(gudevice)
-
 class DRMDevice(Device):
     DEFAULT_ICON = 'video-display'
 
@@ -21,35 +21,6 @@
 
 from udevdiscover.device import Device
 
-def get_device_object(device):
-    if device.get_name().startswith('input'):
-        return InputDevice(device)
-
-    property_keys = device.get_property_keys()
-
-    if 'ID_INPUT_KEYBOARD' in property_keys:
-        from keyboard import KeyboardDevice
-        return KeyboardDevice(device)
-    elif 'ID_INPUT_MOUSE' in property_keys:
-        from mouse import MouseDevice
-        return MouseDevice(device)
-    elif 'ID_INPUT_TOUCHPAD' in property_keys:
-        from touchpad import TouchpadDevice
-        return TouchpadDevice(device)
-    elif 'ID_INPUT_JOYSTICK' in property_keys:
-        from joystick import JoystickDevice
-        return JoystickDevice(device)
-    elif 'ID_INPUT_TOUCHSCREEN' in property_keys:
-        from touchscreen import TouchscreenDevice
-        return TouchscreenDevice(device)
-    elif 'ID_INPUT_TABLET' in property_keys:
-        from tablet import TabletDevice
-        return TabletDevice(device)
-    elif device.get_name().startswith('event'):
-        return EventDevice(device)
-    else:
-        return InputDevice(device)
-
 class InputDevice(Device):
     @property
     def nice_label(self):
@@ -38,9 +38,6 @@ def size_for_display(size):
     else:
         return "%.1f GB" % (size / GB)
 
-def get_device_object(device):
-    return NetDevice(device)
-
 class NetDevice(Device):
     DEFAULT_ICON = 'network-wired'
 
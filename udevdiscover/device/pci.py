@@ -22,17 +22,11 @@
 # Authors : J. Félix Ontañón <fontanon@emergya.es>
 # 
 
-import subprocess
-import re
-
+from udevdiscover import hwdb
 from udevdiscover.device import Device
-from udevdiscover.utils import memoized
+from udevdiscover.device.classcodes import ClassCodeIndex
 
 UNKNOWN_NAME = 'Unknown PCI Device'
-PCI_DB_CMD = '/lib/udev/pci-db'
-
-vendor_regex = re.compile('(?<=ID_VENDOR_FROM_DATABASE=).*')
-model_regex = re.compile('(?<=ID_MODEL_FROM_DATABASE=).*')
 
 pci_class_names = {
     (0x01,   -1,   -1): (_('Storage Controller'), _('Mass Storage Controller')),
@@ -182,47 +176,25 @@ pci_class_names = {
     (0x11, 0x01,   -1): (_('Performance Counters'), _('Performance Counters'))
 }
 
-def get_device_object(device):
-    return PCIDevice(device)
+pci_class_index = ClassCodeIndex(pci_class_names, (UNKNOWN_NAME, UNKNOWN_NAME))
 
-@memoized
 def get_pci_short_long_names(pci_class, pci_subclass, pci_protocol):
-    key = [pci_class]
-
-    klasses = [k for k in pci_class_names.keys() if k[0] == pci_class]
-    if not klasses:
-        return UNKNOWN_NAME, UNKNOWN_NAME
-
-    subklasses = [s for s in klasses if s[1] == pci_subclass]
-    
-    if not subklasses:
-        key.append(-1)
-    else:
-        key.append(pci_subclass)
-
-    if not (key[0], key[1], pci_protocol) in klasses:
-        key.append(-1)
-    else:
-        key.append(pci_protocol)
-
-    if pci_class_names.has_key(tuple(key)):
-        return pci_class_names[tuple(key)]
-    else:
-        return pci_class_names[(pci_class, -1, -1)]
-
-@memoized
-def get_pci_vendor_model_names(sysfs_path):
-    vendor_name, model_name = None, None
-
-    process = subprocess.Popen([PCI_DB_CMD, sysfs_path], stdout=subprocess.PIPE)
-    if process.wait() == 0:
-        output = process.communicate()[0]
-        vendor_res = vendor_regex.search(output)
-        model_res = model_regex.search(output)
-        if vendor_res: vendor_name = vendor_res.group(0)
-        if model_res: model_name = model_res.group(0)
-
-    return vendor_name, model_name
+    return pci_class_index.lookup(pci_class, pci_subclass, pci_protocol)
+
+def get_pci_modalias(device):
+    '''The modalias up to the ids names depend on, not the class'''
+
+    modalias = device.get_property('MODALIAS')
+    if modalias:
+        # Hex digits are upper case, so bc can only start the class
+        modalias = modalias.split('bc')[0]
+    elif device.get_property('PCI_ID'):
+        vendor, model = device.get_property('PCI_ID').split(':')
+        modalias = 'pci:v%08Xd%08X' % (int(vendor, 16), int(model, 16))
+    return modalias
+
+def get_pci_vendor_model_names(modalias):
+    return hwdb.get_vendor_model_names(modalias)
 
 class PCIDevice(Device):
     DEFAULT_ICON = 'udev-discover-device-pci'
@@ -249,8 +221,10 @@ class PCIDevice(Device):
 
     @property
     def vendor_name(self):
-        return get_pci_vendor_model_names(self.path.split('/sys')[1])[0]
+        return self.device.get_property('ID_VENDOR_FROM_DATABASE') or \
+            get_pci_vendor_model_names(get_pci_modalias(self.device))[0]
 
     @property
     def model_name(self):
-        return get_pci_vendor_model_names(self.path.split('/sys')[1])[1]
+        return self.device.get_property('ID_MODEL_FROM_DATABASE') or \
+            get_pci_vendor_model_names(get_pci_modalias(self.device))[1]
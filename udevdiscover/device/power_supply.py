@@ -21,18 +21,6 @@
 
 from udevdiscover.device import Device
 
-def get_device_object(gudevice):
-    parent = gudevice.get_parent()
-
-    if parent:
-        devtype = parent.get_driver()
-        if devtype == 'ac':
-            return ACAdapterDevice(gudevice)
-        elif devtype == 'battery':
-            return BatteryDevice(gudevice)
-
-    return PowerSupplyDevice(gudevice)
-
 class PowerSupplyDevice(Device):
     @property
     def nice_label(self):
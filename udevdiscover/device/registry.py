@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+Which Device class wraps each udev device, told by a table of rules on
+the subsystem, devtype and a predicate of each device.
+
+Third-party packages can add their own rules through the
+'udevdiscover.device_classes' entry point group: each entry point is a
+callable given the DeviceRegistry to register() its classes on.
+'''
+
+import warnings
+
+try:
+    import pkg_resources
+except ImportError:
+    pkg_resources = None
+
+ENTRY_POINT_GROUP = 'udevdiscover.device_classes'
+
+# Package the class names of the rules are relative to
+PACKAGE = 'udevdiscover.device'
+
+def has_property(key):
+    return lambda gudevice: gudevice.has_property(key)
+
+def has_value(key):
+    return lambda gudevice: bool(gudevice.get_property(key))
+
+def name_startswith(prefix):
+    return lambda gudevice: (gudevice.get_name() or '').startswith(prefix)
+
+def name_in(names):
+    names = frozenset(names)
+    return lambda gudevice: gudevice.get_name() in names
+
+def parent_driver(driver):
+    def predicate(gudevice):
+        parent = gudevice.get_parent()
+        return parent is not None and parent.get_driver() == driver
+    return predicate
+
+# (subsystem, devtype, predicate, class) rules. For a given subsystem, the
+# ones of its very devtype are tried before those of any devtype (None),
+# in this order, and the first one whose predicate (if any) is met wins.
+DEVICE_CLASSES = (
+    ('usb', 'usb_interface', None, 'usb:USBInterface'),
+    ('usb', None, None, 'usb:USBDevice'),
+    ('pci', None, None, 'pci:PCIDevice'),
+    ('block', 'disk', has_value('ID_CDROM_MEDIA'),
+        'block.optical:OpticalDiskDevice'),
+    ('block', 'disk', has_value('ID_CDROM'), 'block.optical:OpticalDevice'),
+    ('block', 'disk', has_value('ID_BUS'), 'block.disk:DiskDevice'),
+    ('block', 'partition', None, 'block.partition:PartitionDevice'),
+    ('block', None, None, 'block:BlockDevice'),
+    ('scsi', 'scsi_host', None, 'scsi:SCSIHostDevice'),
+    ('scsi', 'scsi_target', None, 'scsi:SCSITargetDevice'),
+    ('scsi', None, None, 'scsi:SCSIDevice'),
+    ('input', None, name_startswith('input'), 'input:InputDevice'),
+    ('input', None, has_property('ID_INPUT_KEYBOARD'),
+        'input.keyboard:KeyboardDevice'),
+    ('input', None, has_property('ID_INPUT_MOUSE'), 'input.mouse:MouseDevice'),
+    ('input', None, has_property('ID_INPUT_TOUCHPAD'),
+        'input.touchpad:TouchpadDevice'),
+    ('input', None, has_property('ID_INPUT_JOYSTICK'),
+        'input.joystick:JoystickDevice'),
+    ('input', None, has_property('ID_INPUT_TOUCHSCREEN'),
+        'input.touchscreen:TouchscreenDevice'),
+    ('input', None, has_property('ID_INPUT_TABLET'),
+        'input.tablet:TabletDevice'),
+    ('input', None, name_startswith('event'), 'input:EventDevice'),
+    ('input', None, None, 'input:InputDevice'),
+    ('net', None, None, 'net:NetDevice'),
+    ('power_supply', None, parent_driver('ac'), 
+        'power_supply:ACAdapterDevice'),
+    ('power_supply', None, parent_driver('battery'),
+        'power_supply:BatteryDevice'),
+    ('power_supply', None, None, 'power_supply:PowerSupplyDevice'),
+    ('tty', None, None, 'tty:SerialDevice'),
+    ('sound', None, name_startswith('card'), 'sound:SoundCardDevice'),
+    ('sound', None, name_in(('timer', 'seq', 'sequencer')),
+        'sound:SystemSoundDevice'),
+    ('sound', None, None, 'sound:SoundDevice'),
+    ('drm', None, None, 'drm:DRMDevice'),
+)
+
+def load_class(spec):
+    '''The class named 'module:Class' (module relative to PACKAGE)'''
+    if not isinstance(spec, basestring):
+        return spec
+
+    module_name, sep, class_name = spec.partition(':')
+    module_name = module_name and '%s.%s' % (PACKAGE, module_name) or PACKAGE
+    module = __import__(module_name, globals(), locals(), [class_name])
+    return getattr(module, class_name)
+
+class DeviceRegistry(object):
+    '''
+    The rules telling the Device class of a device. They get compiled, for
+    each (subsystem, devtype) seen, into the short list of the ones that
+    may apply, so a device costs a dict lookup and its predicates.
+    '''
+
+    def __init__(self, rules=DEVICE_CLASSES, default=':Device',
+            entry_points=True):
+        self.rules = list(rules)
+        self.default = default
+        self.entry_points = entry_points
+        self.compiled = {}
+        self.classes = {}
+
+    def register(self, subsystem, cls, devtype=None, predicate=None,
+            first=False):
+        '''
+        Add a rule for cls, either a class or its 'module:Class' name.
+        With first, it goes before the rules already there, to override
+        them.
+        '''
+        rule = (subsystem, devtype, predicate, cls)
+        if first:
+            self.rules.insert(0, rule)
+        else:
+            self.rules.append(rule)
+        self.compiled.clear()
+
+    def load_entry_points(self):
+        '''Let the installed third-party packages register their rules'''
+        self.entry_points = False
+        if pkg_resources is None:
+            return
+
+        for entry_point in pkg_resources.iter_entry_points(ENTRY_POINT_GROUP):
+            try:
+                entry_point.load()(self)
+            except Exception, error:
+                warnings.warn('Skipping device classes from %s: %s' % (
+                    entry_point, error))
+
+    def resolve(self, gudevice):
+        '''The Device class for gudevice'''
+        if self.entry_points:
+            self.load_entry_points()
+
+        key = (gudevice.get_subsystem(), gudevice.get_devtype())
+        rules = self.compiled.get(key)
+        if rules is None:
+            rules = self.compiled[key] = self.__compile(*key)
+
+        for predicate, cls in rules:
+            if predicate is None or predicate(gudevice):
+                return cls
+
+    def classify(self, gudevice):
+        '''A new Device of the right class for gudevice'''
+        return self.resolve(gudevice)(gudevice)
+
+    def __compile(self, subsystem, devtype):
+        rules = [rule for rule in self.rules if rule[0] == subsystem and
+            devtype is not None and rule[1] == devtype]
+        rules.extend([rule for rule in self.rules if rule[0] == subsystem and
+            rule[1] is None])
+        rules.append((None, None, None, self.default))
+
+        compiled = []
+        for subsystem, devtype, predicate, spec in rules:
+            cls = self.classes.get(spec)
+            if cls is None:
+                cls = self.classes[spec] = load_class(spec)
+            compiled.append((predicate, cls))
+
+            # Nothing after a rule for any device would ever be tried
+            if predicate is None:
+                break
+
+        return compiled
+
+registry = DeviceRegistry()
@@ -21,16 +21,6 @@
 
 from udevdiscover.device import Device
 
-def get_device_object(gudevice):
-    devtype = gudevice.get_property('DEVTYPE')
-
-    if devtype == 'scsi_host':
-        return SCSIHostDevice(gudevice)
-    elif devtype == 'scsi_target':
-        return SCSITargetDevice(gudevice)
-    else:
-        return SCSIDevice(gudevice)
-
 class SCSIDevice(Device):
     @property
     def nice_label(self):
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+import os
+import sys
+
+# Properties whose values are mostly unique to each device, not worth
+# keeping in the shared table
+UNIQUE_PROPERTIES = ('DEVPATH', 'DEVNAME', 'DEVLINKS', 'SEQNUM', 'MINOR',
+    'USEC_INITIALIZED', 'IFINDEX', 'INTERFACE', 'ID_PATH', 'ID_PATH_TAG',
+    'ID_SERIAL', 'ID_SERIAL_SHORT', 'ID_WWN', 'ID_WWN_WITH_EXTENSION',
+    'ID_FS_UUID', 'ID_FS_UUID_ENC', 'ID_PART_TABLE_UUID',
+    'ID_PART_ENTRY_UUID', 'ID_PART_ENTRY_OFFSET', 'ID_PART_ENTRY_SIZE',
+    'ID_PART_ENTRY_NUMBER', 'PCI_SLOT_NAME', 'BUSNUM', 'DEVNUM')
+
+class StringTable(object):
+    '''
+    One shared copy of each property key and common value across all
+    the snapshots, as udev hands out a new string on every call. Once
+    maxsize strings are held, new ones are no longer added.
+    '''
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.strings = {}
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def intern(self, string):
+        if string is None:
+            return None
+
+        shared = self.strings.get(string)
+        if shared is None:
+            self.misses += 1
+            if len(self.strings) < self.maxsize:
+                self.strings[string] = string
+            return string
+
+        self.hits += 1
+        if shared is not string:
+            self.bytes_saved += sys.getsizeof(string)
+        return shared
+
+    def intern_props(self, props):
+        '''A copy of the props dict with its keys and values interned'''
+        interned = {}
+        intern = self.intern
+        for key, value in props.iteritems():
+            if key not in UNIQUE_PROPERTIES:
+                value = intern(value)
+            interned[intern(key)] = value
+        return interned
+
+    def get_stats(self):
+        '''
+        How much the table saves: bytes_saved counts the duplicates not
+        kept, table_bytes what the table itself takes besides the strings
+        '''
+        return {'size': len(self.strings), 'hits': self.hits, 
+            'misses': self.misses, 'bytes_saved': self.bytes_saved,
+            'table_bytes': sys.getsizeof(self.strings)}
+
+strings = StringTable()
+
+class DeviceSnapshot(object):
+    '''
+    An immutable copy of what udev tells about a device, taken once with
+    the same read-only API of GUdev.Device, so that reading it later costs
+    no GObject introspection calls.
+
+    The GUdev.Device it was taken from is kept as handle only for walking
+    to its parent. Without it, just the parent sysfs path is known.
+    '''
+
+    __slots__ = ('handle', 'sysfs_path', 'subsystem', 'name', 'number', 
+        'devtype', 'driver', 'action', 'seqnum', 'device_type', 
+        'device_number', 'device_file', 'symlinks', 'props', 'tags',
+        'parent_path')
+
+    def __init__(self, device, keep_handle=True):
+        if isinstance(device, DeviceSnapshot):
+            for attr in self.__slots__:
+                object.__setattr__(self, attr, getattr(device, attr))
+            if not keep_handle:
+                self.__release()
+            return
+
+        intern = strings.intern
+        props = {}
+        for key in device.get_property_keys():
+            props[key] = device.get_property(key)
+
+        set_value = object.__setattr__
+        set_value(self, 'handle', device)
+        set_value(self, 'sysfs_path', device.get_sysfs_path())
+        set_value(self, 'subsystem', intern(device.get_subsystem()))
+        set_value(self, 'name', device.get_name())
+        set_value(self, 'number', device.get_number())
+        set_value(self, 'devtype', intern(device.get_devtype()))
+        set_value(self, 'driver', intern(device.get_driver()))
+        set_value(self, 'action', intern(device.get_action()))
+        set_value(self, 'seqnum', device.get_seqnum())
+        set_value(self, 'device_type', device.get_device_type())
+        set_value(self, 'device_number', device.get_device_number())
+        set_value(self, 'device_file', device.get_device_file())
+        set_value(self, 'symlinks', tuple(device.get_device_file_symlinks()))
+        set_value(self, 'props', strings.intern_props(props))
+        set_value(self, 'tags', tuple(intern(tag) 
+            for tag in device.get_tags() or ()))
+        set_value(self, 'parent_path', getattr(device, 'parent_path', False))
+
+        if not keep_handle:
+            self.__release()
+
+    def __release(self):
+        if self.parent_path is False:
+            object.__setattr__(self, 'parent_path', self.get_parent_path())
+        object.__setattr__(self, 'handle', None)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError, 'DeviceSnapshot is immutable'
+
+    def without_handle(self):
+        '''A copy of this snapshot not holding the GUdev.Device any longer'''
+        return DeviceSnapshot(self, False)
+
+    def moved(self, old_path, new_path):
+        '''
+        A copy of this snapshot, without handle, for when the device tree
+        at old_path has been moved to new_path
+        '''
+        def rebase(path):
+            if path == old_path or path and path.startswith(old_path + '/'):
+                return new_path + path[len(old_path):]
+            return path
+
+        snapshot = DeviceSnapshot(self, False)
+        set_value = object.__setattr__
+        sysfs_path = rebase(self.sysfs_path)
+        set_value(snapshot, 'sysfs_path', sysfs_path)
+        set_value(snapshot, 'name', os.path.basename(sysfs_path))
+        set_value(snapshot, 'parent_path', rebase(snapshot.parent_path))
+
+        devpath = self.props.get('DEVPATH')
+        if devpath and self.sysfs_path.endswith(devpath):
+            props = dict(self.props)
+            props['DEVPATH'] = sysfs_path[len(self.sysfs_path) - len(devpath):]
+            set_value(snapshot, 'props', props)
+
+        return snapshot
+
+    def get_parent(self):
+        '''The parent GUdev.Device, None if there is none or no handle'''
+        if self.handle is None:
+            return None
+        return self.handle.get_parent()
+
+    def get_parent_path(self):
+        if self.parent_path is False:
+            parent = self.get_parent()
+            object.__setattr__(self, 'parent_path', 
+                parent and parent.get_sysfs_path() or None)
+        return self.parent_path
+
+    def get_sysfs_path(self):
+        return self.sysfs_path
+
+    def get_subsystem(self):
+        return self.subsystem
+
+    def get_name(self):
+        return self.name
+
+    def get_number(self):
+        return self.number
+
+    def get_devtype(self):
+        return self.devtype
+
+    def get_driver(self):
+        return self.driver
+
+    def get_action(self):
+        return self.action
+
+    def get_seqnum(self):
+        return self.seqnum
+
+    def get_device_type(self):
+        return self.device_type
+
+    def get_device_number(self):
+        return self.device_number
+
+    def get_device_file(self):
+        return self.device_file
+
+    def get_device_file_symlinks(self):
+        return list(self.symlinks)
+
+    def get_property_keys(self):
+        return self.props.keys()
+
+    def get_property(self, key):
+        return self.props.get(key)
+
+    def has_property(self, key):
+        return key in self.props
+
+    def get_tags(self):
+        return list(self.tags)
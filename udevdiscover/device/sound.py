@@ -21,16 +21,6 @@
 
 from udevdiscover.device import Device
 
-def get_device_object(gudevice):
-    devname = gudevice.get_name()
-    
-    if devname.startswith('card'):
-        return SoundCardDevice(gudevice)
-    elif devname in ('timer', 'seq', 'sequencer'):
-        return SystemSoundDevice(gudevice)
-    else:
-        return SoundDevice(gudevice)
-
 class SoundCardDevice(Device):
     DEFAULT_ICON = 'audio-card'
 
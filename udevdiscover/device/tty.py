@@ -21,9 +21,6 @@
 
 from udevdiscover.device import Device
 
-def get_device_object(gudevice):
-    return SerialDevice(gudevice)
-
 class SerialDevice(Device):
     def __init__(self, gudevice):
         super(SerialDevice, self).__init__(gudevice)
@@ -44,7 +41,7 @@ class SerialDevice(Device):
 
     @property
     def nice_label(self):
-        if self.type == 'platform':
+        if self.type == 'platform' and self.parent is not None:
             return _('%s Serial Port') % self.parent.nice_label
         elif self.type == 'usb':
             return _('USB Serial Port')
@@ -22,17 +22,11 @@
 # Authors : J. Félix Ontañón <fontanon@emergya.es>
 # 
 
-import subprocess
-import re
-
+from udevdiscover import hwdb
 from udevdiscover.device import Device
-from udevdiscover.utils import memoized
+from udevdiscover.device.classcodes import ClassCodeIndex
 
 UNKNOWN_NAME = 'Unknown USB Device'
-USB_DB_CMD = '/lib/udev/usb-db'
-
-vendor_regex = re.compile('(?<=ID_VENDOR_FROM_DATABASE=).*')
-model_regex = re.compile('(?<=ID_MODEL_FROM_DATABASE=).*')
 
 usb_class_names = {
     (0x01,   -1,   -1): (_('Audio'), _('Audio')),
@@ -145,52 +139,26 @@ usb_class_names = {
     (0xfe, 0x03, 0x02): (_('USB488 Test and Measurement'), _('USB488 Test and Measurement')),
 }
 
-def get_device_object(device):
-    devtype = device.get_devtype()
-    
-    if devtype == 'usb_interface':
-        return USBInterface(device)
-    else:
-        return USBDevice(device)
+usb_class_index = ClassCodeIndex(usb_class_names, (None, None))
 
-@memoized
 def get_usb_short_long_names(usb_class, usb_subclass, usb_protocol):
-    key = [usb_class]
-
-    klasses = [k for k in usb_class_names.keys() if k[0] == usb_class]
-    if not klasses:
-        return None, None
-
-    subklasses = [s for s in klasses if s[1] == usb_subclass]
-
-    if not subklasses:
-        key.append(-1)
-    else:
-        key.append(usb_subclass)
-
-    if not (key[0], key[1], usb_protocol) in klasses:
-        key.append(-1)
-    else:
-        key.append(usb_protocol)
-
-    if usb_class_names.has_key(tuple(key)):
-        return usb_class_names[tuple(key)]
-    else:
-        return usb_class_names[(usb_class, -1, -1)]
+    return usb_class_index.lookup(usb_class, usb_subclass, usb_protocol)
 
-@memoized
-def get_usb_vendor_model_names(sysfs_path):
-    vendor_name, model_name = None, None
+def get_usb_modalias(device):
+    '''The modalias up to the vendor and product ids names depend on'''
 
-    process = subprocess.Popen([USB_DB_CMD, sysfs_path], stdout=subprocess.PIPE)
-    if process.wait() == 0:
-        output = process.communicate()[0]
-        vendor_res = vendor_regex.search(output)
-        model_res = model_regex.search(output)
-        if vendor_res: vendor_name = vendor_res.group(0)
-        if model_res: model_name = model_res.group(0)
+    modalias = device.get_property('MODALIAS')
+    if modalias:
+        # As in usb:v046DpC52B
+        modalias = modalias[:14]
+    elif device.get_property('PRODUCT'):
+        # Devices only have PRODUCT, as in 46d/c52b/1200
+        vendor, model = device.get_property('PRODUCT').split('/')[:2]
+        modalias = 'usb:v%04Xp%04X' % (int(vendor, 16), int(model, 16))
+    return modalias
 
-    return vendor_name, model_name
+def get_usb_vendor_model_names(modalias):
+    return hwdb.get_vendor_model_names(modalias)
 
 class USBDevice(Device):
     DEFAULT_ICON = 'udev-discover-device-usb'
@@ -221,12 +189,14 @@ class USBDevice(Device):
     @property
     def vendor_name(self):
         return self.device.get_property('ID_VENDOR') or \
-            get_usb_vendor_model_names(self.path.split('/sys')[1])[0]
+            self.device.get_property('ID_VENDOR_FROM_DATABASE') or \
+            get_usb_vendor_model_names(get_usb_modalias(self.device))[0]
 
     @property
     def model_name(self):
         return self.device.get_property('ID_MODEL') or \
-            get_usb_vendor_model_names(self.path.split('/sys')[1])[1]
+            self.device.get_property('ID_MODEL_FROM_DATABASE') or \
+            get_usb_vendor_model_names(get_usb_modalias(self.device))[1]
 
 class USBInterface(Device):
     DEFAULT_ICON = 'udev-discover-device-usb'
@@ -22,23 +22,110 @@
 # Authors : J. Félix Ontañón <fontanon@emergya.es>
 # 
 
-# (http://mednis.info/use-girequire_versiongtk-30-before-import.html)
-import gi
-gi.require_version("GUdev", "1.0")
+import copy
+import os
+import time
+from collections import OrderedDict
+
 from gi.repository import GObject
-from gi.repository import GUdev
+import caching
 import device 
+from backend import get_backend
+from coalescer import EventCoalescer
+from columnar import ColumnarStore
+from enrichment import DeviceEnricher, VISIBLE
+from eventqueue import EventWorker
+from identitymap import DeviceIdentityMap
+from match import DeviceMatch
+from query import Query
+from searchindex import FieldIndex, TrigramIndex
+
+# Ways of keeping the devices tree, see DeviceFinder.__init__
+STORES = ('dict', 'columnar')
+
+# The uevents whose Device is built and enriched by decode_events
+DECODED_ACTIONS = ('add', 'change', 'bind', 'unbind', 'online', 'offline')
+
+SYSFS_SUBSYSTEM_DIRS = (('/sys/class', ''), ('/sys/bus', 'devices'))
+
+# Counts of devices per (subsystem, devices directory), kept until a uevent
+# of that subsystem comes in
+subsystems_cache = {}
+
+def get_subsystem_dirs():
+    '''The (subsystem, devices directory) pairs on sysfs'''
+    dirs = []
+    for sysfs_dir, devices_dir in SYSFS_SUBSYSTEM_DIRS:
+        if not os.path.isdir(sysfs_dir): continue
+
+        for subsystem in os.listdir(sysfs_dir):
+            dirs.append((subsystem,
+                os.path.join(sysfs_dir, subsystem, devices_dir)))
+    return dirs
+
+def get_subsystem_counts():
+    '''
+    Map the subsystems on the system to their number of devices. It just
+    lists the subsystem directories on sysfs, so no device is enumerated.
+    Only /sys/class and /sys/bus are listed on every call: the devices
+    directory of a subsystem is listed again if it is new, had no devices
+    or a uevent of its subsystem came in since.
+    '''
+    global subsystems_cache
+
+    cache = {}
+    counts = {}
+    for subsystem, path in get_subsystem_dirs():
+        count = subsystems_cache.get((subsystem, path))
+        if not count:
+            try:
+                count = len(os.listdir(path))
+            except OSError:
+                continue
+        cache[subsystem, path] = count
+        counts[subsystem] = counts.get(subsystem, 0) + count
+
+    # Those gone from sysfs are left out
+    subsystems_cache = cache
+    return counts
 
 def get_subsystems():
-    client = GUdev.Client.new('')
-    subsys = []
+    '''The subsystems having devices'''
+    return sorted([subsystem for subsystem, count in
+        get_subsystem_counts().iteritems() if count])
+
+def decode_events(events):
+    '''
+    Build the Device objects of a list of (action, gudevice) uevents, 
+    reading their slowest properties once, so that it can be done out of
+    the main loop. Returns a list of (action, gudevice, device).
+    '''
+    decoded = []
+    for action, gudevice in events:
+        dev = None
+        if action in DECODED_ACTIONS:
+            dev = device.get_device_object(gudevice)
+            dev.enrich()
+        decoded.append((action, gudevice, dev))
 
-    for device in client.query_by_subsystem('*'):
-        device_subsystem = device.get_subsystem()
-        if not device_subsystem in subsys:
-            subsys.append(device_subsystem)
+    return decoded
 
-    return subsys
+def get_old_path(gudevice):
+    '''The sysfs path a moved gudevice had, from its DEVPATH_OLD'''
+    new_path = gudevice.get_sysfs_path()
+    devpath = gudevice.get_property('DEVPATH')
+    old_devpath = gudevice.get_property('DEVPATH_OLD')
+    return old_devpath and devpath and \
+        new_path[:len(new_path) - len(devpath)] + old_devpath
+
+def track_subsystem_event(action, subsystem):
+    '''Have the devices of subsystem counted again after a uevent'''
+    if not subsystem or action not in ('add', 'remove'):
+        return
+
+    for key in subsystems_cache.keys():
+        if key[0] == subsystem:
+            del subsystems_cache[key]
 
 class DeviceFinder(GObject.GObject):
     '''
@@ -53,102 +140,610 @@ class DeviceFinder(GObject.GObject):
             (GObject.TYPE_PYOBJECT,)),
         'changed': (GObject.SignalFlags.RUN_LAST, None,
             (GObject.TYPE_PYOBJECT, GObject.TYPE_PYOBJECT,)),
+        'moved': (GObject.SignalFlags.RUN_LAST, None,
+            (GObject.TYPE_PYOBJECT, GObject.TYPE_PYOBJECT,)),
+        'bound': (GObject.SignalFlags.RUN_LAST, None,
+            (GObject.TYPE_PYOBJECT, GObject.TYPE_PYOBJECT,)),
+        'unbound': (GObject.SignalFlags.RUN_LAST, None,
+            (GObject.TYPE_PYOBJECT, GObject.TYPE_PYOBJECT,)),
+        'online': (GObject.SignalFlags.RUN_LAST, None,
+            (GObject.TYPE_PYOBJECT, GObject.TYPE_PYOBJECT,)),
+        'offline': (GObject.SignalFlags.RUN_LAST, None,
+            (GObject.TYPE_PYOBJECT, GObject.TYPE_PYOBJECT,)),
+        'subtree-removed': (GObject.SignalFlags.RUN_LAST, None,
+            (GObject.TYPE_PYOBJECT, GObject.TYPE_PYOBJECT,)),
+        'reconciled': (GObject.SignalFlags.RUN_LAST, None,
+            (GObject.TYPE_PYOBJECT,)),
+        'batch': (GObject.SignalFlags.RUN_LAST, None,
+            (GObject.TYPE_PYOBJECT,)),
+        'enriched': (GObject.SignalFlags.RUN_LAST, None,
+            (GObject.TYPE_PYOBJECT,)),
     }
 
-    def __init__(self, subsystems='', parent_tree=False):
+    def __init__(self, subsystems='', parent_tree=False, backend='gudev',
+        keep_handles=True, store='dict'):
         '''
         Create a new DeviceFinder and attach to the udev system to 
-        listen for events.
+        listen for events. backend is the name of the one to get devices
+        from (see udevdiscover.backend) or a backend object. If
+        keep_handles is False, devices keep just their snapshot and no
+        GUdev.Device. store is one of STORES: 'dict' keeps a Device object
+        per device, 'columnar' keeps a ColumnarStore for very large trees.
         '''
         GObject.GObject.__init__(self)
 
-        self.client = GUdev.Client.new(subsystems)
-        self.subsystems = subsystems
-        self.parent_tree = parent_tree
-        self.devices_tree = {}
-        self.devices_list = []
-
-        self.client.connect('uevent', self.event)
+        if not store in STORES:
+            raise ValueError, 'Unknown devices store %s' % store
 
-    def scan_subsystems(self, subsystems='', parent_tree=False):
-        self.client = GUdev.Client.new(subsystems)
+        self.backend = get_backend(backend)
         self.subsystems = subsystems
-        self.devices_tree = {}
-        self.devices_list = []
-
-        if subsystems == '': subsystems = ['*']
-        for subsystem in subsystems:
-            for gudevice in self.client.query_by_subsystem(subsystem):
-                if parent_tree: 
-                    self.__explore_parent(gudevice, self.devices_tree, 
-                        self.devices_list)
-                else:
-                    self.devices_list.append(device.get_device_object(gudevice))
-                    self.devices_tree[gudevice.get_sysfs_path()] = \
-                        device.get_device_object(gudevice)
-
-        self.client.connect('uevent', self.event)
         self.parent_tree = parent_tree
+        self.store = store
+        self.identity_map = DeviceIdentityMap(keep_handles=keep_handles)
+        self.devices_tree = self.__new_tree()
+        self.children_index = {}
+        self.match = None
+        self.scan_timings = {}
+        self.coalescer = None
+        self.worker = None
+        self.enricher = None
+        self.search_index = None
+        self.field_index = None
+        self.action_counts = {}
+        self.__batch = None
+
+        self.backend.monitor(subsystems, self.event)
+
+    def scan_subsystems(self, subsystems='', parent_tree=False, match=None):
+        '''
+        Find the devices of the given subsystems (all of them if empty)
+        which also meet match, a DeviceMatch for devtypes, properties or
+        tags. The whole system is enumerated just once and filtered in
+        memory; the time spent on each phase is kept in scan_timings.
+        '''
+        self.backend.monitor(subsystems, self.event)
+        self.subsystems = subsystems
+        self.match = match
+        old_tree = self.devices_tree
+        self.devices_tree = self.__new_tree()
+        self.children_index = {}
+
+        start = time.time()
+        gudevices = self.backend.query()
+        enumerated = time.time()
+
+        if subsystems:
+            subsystems_match = DeviceMatch(subsystems)
+            gudevices = [gudevice for gudevice in gudevices
+                if subsystems_match(gudevice)]
+        if match is not None and not match.is_empty():
+            gudevices = [gudevice for gudevice in gudevices if match(gudevice)]
+        filtered = time.time()
+
+        for gudevice in gudevices:
+            if parent_tree: 
+                self.__explore_parent(gudevice, self.devices_tree)
+            else:
+                path = gudevice.get_sysfs_path()
+                self.devices_tree[path] = self.__build(gudevice, path)
+
+        if not parent_tree:
+            for path in self.devices_tree:
+                self.children_index.setdefault(self.__index_key(path),
+                    set()).add(path)
+        built = time.time()
+
+        self.scan_timings = {
+            'enumerate': enumerated - start,
+            'filter': filtered - enumerated,
+            'build': built - filtered,
+        }
+
+        # Nothing else would forget the devices no longer listed. Columnar
+        # stores are a new identity map already.
+        for path in old_tree:
+            if not self.devices_tree.has_key(path):
+                caching.evict_path(path)
+                if self.store != 'columnar':
+                    self.identity_map.evict(path)
 
-    def __explore_parent(self, gudevice, devices_tree, devices_list, emit=False):
-        path = gudevice.get_sysfs_path()
-        parent = gudevice.get_parent()
+        self.parent_tree = parent_tree
+        self.__enrich_tree()
+        self.__index_tree()
 
-        if parent: 
-            self.__explore_parent(parent, devices_tree, devices_list, emit)
+    def reconcile_subsystems(self, subsystems='', parent_tree=False,
+            match=None):
+        '''
+        Scan again, but diff the result against the current tree by sysfs
+        path and property fingerprint instead of just replacing it.
 
-        if not devices_tree.has_key(path):
-            dev = device.get_device_object(gudevice)
-            devices_tree[path] = dev
-            devices_list.append(dev)
+        Returns, and emits within the 'reconciled' signal, the list of 
+        (action, device, old_device) deltas found, where action is one of
+        'removed' (children first), 'added' (parents first) or 'changed'.
+        old_device is only set for the 'changed' ones.
+        '''
+        old_tree = self.devices_tree
+        old_devices = dict((path, (dev.fingerprint, copy.copy(dev)))
+            for path, dev in old_tree.iteritems())
+
+        self.scan_subsystems(subsystems, parent_tree, match)
+
+        deltas = [('removed', old_tree[path], None) for path in reversed(old_tree)
+            if not self.devices_tree.has_key(path)]
+        changed = []
+
+        for path, dev in self.devices_tree.iteritems():
+            if not old_devices.has_key(path):
+                deltas.append(('added', dev, None))
+                continue
+
+            fingerprint, old_dev = old_devices[path]
+            if dev.fingerprint == fingerprint:
+                continue
+
+            # Classify it again, as it may have become another kind of device
+            new_dev, unused = self.identity_map.update(dev.device)
+            if new_dev is not dev:
+                self.devices_tree[path] = new_dev
+            changed.append(('changed', new_dev, old_dev))
+
+        deltas.extend(changed)
+        if self.enricher is not None:
+            self.enricher.push([dev for action, dev, old_dev in changed])
+        for action, dev, old_dev in changed:
+            self.__index_device(dev)
+        self.emit('reconciled', deltas)
+        return deltas
+
+    def __explore_parent(self, gudevice, devices_tree, emit=False, dev=None):
+        '''
+        Add gudevice and its missing ancestors to the tree. The walk upwards
+        stops at the first ancestor already there, so building the whole
+        tree asks udev for every parent just once. dev is the Device
+        already built for gudevice, if any.
+        '''
+        new_dev = dev
+        chain = []
+        parent_path = None
+
+        while gudevice:
+            path = gudevice.get_sysfs_path()
+            if devices_tree.has_key(path):
+                parent_path = path
+                break
+
+            chain.append((path, gudevice))
+            gudevice = gudevice.get_parent()
+
+        # Add them from the topmost ancestor down to gudevice
+        for path, gudevice in reversed(chain):
+            devices_tree[path] = self.__build(gudevice, path,
+                path == chain[0][0] and new_dev or None)
+            self.children_index.setdefault(parent_path, set()).add(path)
+            parent_path = path
 
             if emit:
-                self.emit('added', dev)
+                self.__notify('added', devices_tree[path])
+
+    def __new_tree(self):
+        if self.store == 'columnar':
+            # The store is the identity map of its own devices
+            self.identity_map = ColumnarStore(
+                keep_handles=self.identity_map.keep_handles)
+            return self.identity_map
+        return OrderedDict()
+
+    def __build(self, gudevice, path, dev=None):
+        '''
+        What the tree keeps for gudevice: its Device, or on a columnar
+        store just its row until the Device is asked for
+        '''
+        if dev is None and self.store == 'columnar':
+            return gudevice
+        return self.identity_map.lookup(gudevice, path, dev)
 
     def get_devices_tree(self):
         return self.devices_tree
 
     def get_devices(self):
-        return self.devices_list
+        '''A live view of the devices on the tree, parents first'''
+        return self.devices_tree.viewvalues()
+
+    def select(self, match):
+        '''The devices on the tree meeting match, a DeviceMatch'''
+        if self.store == 'columnar':
+            return [self.devices_tree[path] for path in 
+                self.devices_tree.select(match)]
+        return [dev for dev in self.devices_tree.itervalues() 
+            if match(dev.device)]
+
+    def get_children(self, path):
+        '''
+        Get the sysfs paths of the known children of the device at path, or
+        of the topmost devices if path is None. On flat trees, the closest
+        ancestor on the tree stands for the parent.
+        '''
+        return self.children_index.get(path, set())
+
+    def set_coalescing(self, window=100, max_events=0):
+        '''
+        Collect uevents for window milliseconds, or until max_events came,
+        and collapse the redundant ones. Instead of one signal per event,
+        a single 'batch' is then emitted with the resulting list of 
+        (action, device, old_device) deltas, action being one of 'added', 
+        'removed' or 'changed'. A window of 0 turns it off.
+        '''
+        if self.coalescer is not None:
+            self.coalescer.flush()
+
+        if window:
+            self.coalescer = EventCoalescer(self.__decode, window, max_events)
+        else:
+            self.coalescer = None
+
+    def set_event_worker(self, maxsize=256, policy='block'):
+        '''
+        Build and classify the devices of uevents on a worker thread, 
+        through a queue of up to maxsize jobs with the given overflow
+        policy (see udevdiscover.eventqueue). Only the finished devices get
+        back to the main loop. A maxsize of 0 turns it off.
+        '''
+        if self.worker is not None:
+            self.worker.stop()
+
+        if maxsize:
+            self.worker = EventWorker(decode_events, self.__apply, maxsize,
+                policy)
+        else:
+            self.worker = None
+
+    def set_enrichment(self, threads=2, interval=100):
+        '''
+        Read the slow fields of the devices on the tree (see Device.enrich)
+        on a pool of threads after every scan, and of every device added or
+        changed afterwards. The devices done are emitted in an 'enriched'
+        signal at most every interval milliseconds. 0 threads turn it off.
+        '''
+        if self.enricher is not None:
+            self.enricher.stop()
+
+        if threads:
+            self.enricher = DeviceEnricher(self.__enriched, threads, interval)
+            self.__enrich_tree()
+        else:
+            self.enricher = None
+
+    def prioritize(self, devices, priority=VISIBLE):
+        '''Enrich devices, i.e. those on screen, before the rest'''
+        if self.enricher is not None:
+            self.enricher.push(devices, priority)
+
+    def __enrich_tree(self):
+        # Columnar stores build Devices when asked for, and let them go.
+        # Devices kept from a previous scan unchanged are enriched already.
+        if self.enricher is not None and self.store == 'dict':
+            self.enricher.clear()
+            self.enricher.push([dev for dev in self.devices_tree.itervalues()
+                if not dev.enriched])
+
+    def set_search_index(self, enabled=True):
+        '''
+        Keep a TrigramIndex and a FieldIndex of the devices on the tree, in
+        line with every uevent, for search() and query() to answer from. Not
+        worth it on columnar stores, as they would hold every Device built.
+        '''
+        if enabled:
+            self.search_index = TrigramIndex()
+            self.field_index = FieldIndex()
+            self.__index_tree()
+        else:
+            self.search_index = None
+            self.field_index = None
+
+    def search(self, search_string):
+        '''
+        The devices on the tree match_string() would find search_string
+        around, from the search index if there is one
+        '''
+        if self.search_index is not None:
+            return [self.devices_tree[path] for path in
+                self.search_index.search(search_string)]
+
+        search_string = search_string.lower()
+        return [dev for dev in self.devices_tree.itervalues()
+            if device.match_string(dev, search_string)]
+
+    def query(self, query):
+        '''
+        The devices on the tree matching query, a Query or the text of one,
+        answered from the indexes where they can
+        '''
+        if not isinstance(query, Query):
+            query = Query(query)
+        return [self.devices_tree[path] for path in query.select(self)]
+
+    def explain(self, query):
+        '''How query is answered, with the rows each step gives'''
+        if not isinstance(query, Query):
+            query = Query(query)
+        return query.explain(self)
+
+    def __index_tree(self):
+        if self.search_index is not None:
+            self.search_index.clear()
+            self.field_index.clear()
+            for dev in self.devices_tree.itervalues():
+                self.__index_device(dev)
+
+    def __index_device(self, dev):
+        if self.search_index is not None:
+            self.search_index.add(dev)
+            self.field_index.add(dev)
+
+    def __unindex_device(self, path):
+        if self.search_index is not None:
+            self.search_index.remove(path)
+            self.field_index.remove(path)
+
+    def __enriched(self, devices):
+        self.emit('enriched', devices)
 
     def event(self, client, action, gudevice):
         '''Handle a udev event'''
 
-        return {
+        if action != 'add':
+            # Before its Device may be built again off the main loop
+            caching.evict_path(gudevice.get_sysfs_path())
+            if action == 'move':
+                caching.evict_path(get_old_path(gudevice))
+
+        if self.coalescer is not None:
+            self.coalescer.push(action, gudevice)
+        else:
+            self.__decode([(action, gudevice)])
+
+    def dispatch(self, action, gudevice, dev=None):
+        '''
+        Apply a uevent to the tree. dev is the Device already built for 
+        gudevice, if any.
+        '''
+        subsystem = gudevice.get_subsystem()
+        track_subsystem_event(action, subsystem)
+        self.action_counts[action] = self.action_counts.get(action, 0) + 1
+
+        handler = {
             'add': self.device_added,
             'remove': self.device_removed,
             'change': self.device_changed,
-        }.get(action, lambda x,y: None)(gudevice, gudevice.get_subsystem())
+            'move': self.device_moved,
+            'bind': self.device_bound,
+            'unbind': self.device_unbound,
+            'online': self.device_online,
+            'offline': self.device_offline,
+        }.get(action)
+
+        if handler is not None:
+            handler(gudevice, subsystem, dev)
+
+    def get_action_counts(self):
+        '''How many uevents of each action have been applied'''
+        return dict(self.action_counts)
+
+    def __decode(self, events):
+        if self.worker is not None:
+            self.worker.push(events)
+        else:
+            self.__apply(events)
+
+    def __apply(self, events, decoded=None):
+        if decoded is None:
+            decoded = [(action, gudevice, None) for action, gudevice in events]
+
+        if self.coalescer is None:
+            for action, gudevice, dev in decoded:
+                self.dispatch(action, gudevice, dev)
+            return
+
+        self.__batch = []
+        try:
+            for action, gudevice, dev in decoded:
+                self.dispatch(action, gudevice, dev)
+        finally:
+            deltas, self.__batch = self.__batch, None
+
+        if deltas:
+            self.emit('batch', deltas)
+
+    def __notify(self, signal, dev, old_dev=None):
+        if self.enricher is not None and signal != 'removed':
+            self.enricher.push([dev])
+        if signal == 'removed':
+            self.__unindex_device(dev.path)
+        else:
+            if signal == 'moved':
+                self.__unindex_device(old_dev.path)
+            self.__index_device(dev)
+
+        if self.__batch is None:
+            if signal in ('added', 'removed'):
+                self.emit(signal, dev)
+            else:
+                self.emit(signal, dev, old_dev)
+        else:
+            self.__batch.append((signal, dev, old_dev))
 
-    def device_added(self, gudevice, subsystem):
+    def device_added(self, gudevice, subsystem, dev=None):
         '''Called when a device has been added to the system'''
 
-        dev = device.get_device_object(gudevice)
-
         if self.parent_tree: 
-            self.__explore_parent(gudevice, self.devices_tree, self.devices_list, True)
+            self.__explore_parent(gudevice, self.devices_tree, True, dev)
         else:
-            self.devices_list.append(dev)
+            dev = self.identity_map.lookup(gudevice, None, dev)
             self.devices_tree[dev.path] = dev
-            self.emit('added', dev)
+            self.__index_added(dev.path)
+            self.__notify('added', dev)
 
-    def device_removed(self, gudevice, subsystem):
-        '''Called when a device has been removed from the system'''
+    def device_removed(self, gudevice, subsystem, dev=None):
+        '''
+        Called when a device has been removed from the system. Whatever
+        is left of its subtree goes along, in case the removals of the
+        descendants were missed or are still to come, and is told apart
+        in a single 'subtree-removed' signal after 'removed'.
+        '''
+        path = gudevice.get_sysfs_path()
+        descendants = []
+        if self.devices_tree.has_key(path):
+            self.children_index.get(self.__index_key(path), set()
+                ).discard(path)
+            for child_path in reversed(self.__subtree(path)[1:]):
+                caching.evict_path(child_path)
+                self.__unindex_device(child_path)
+                descendants.append(self.identity_map.evict(child_path) or
+                    self.devices_tree[child_path])
+                self.devices_tree.pop(child_path)
+                self.children_index.pop(child_path, None)
+
+        dev = self.identity_map.evict(path) or device.get_device_object(gudevice)
+        self.devices_tree.pop(path, None)
+        self.children_index.pop(path, None)
+
+        if self.__batch is not None:
+            for child in descendants:
+                self.__notify('removed', child)
+            self.__notify('removed', dev)
+        else:
+            self.__notify('removed', dev)
+            if descendants:
+                self.emit('subtree-removed', dev, descendants)
 
-        dev = device.get_device_object(gudevice)
+    def device_changed(self, gudevice, subsystem, dev=None):
+        '''Called when a device has been updated'''
 
-        if dev in self.devices_list: self.devices_list.remove(dev)
-        if self.devices_tree.has_key(dev.path): del(self.devices_tree[dev.path])
+        path = gudevice.get_sysfs_path()
+        if not self.devices_tree.has_key(path):
+            # i.e. it appeared while the tree was being scanned
+            self.device_added(gudevice, subsystem, dev)
+            return
 
-        self.emit('removed', dev)
+        dev, old_dev = self.identity_map.update(gudevice, dev)
+        old_dev = old_dev or self.devices_tree[dev.path]
+        self.devices_tree[dev.path] = dev
+        self.__notify('changed', dev, old_dev)
 
-    def device_changed(self, gudevice, subsystem):
-        '''Called when a device has been updated'''
+    def device_moved(self, gudevice, subsystem, dev=None):
+        '''
+        Called when a device has been renamed or moved to another parent.
+        It and its subtree are re-keyed in place, emitting 'moved' for each
+        of them, parents first.
+        '''
+        new_path = gudevice.get_sysfs_path()
+        old_path = get_old_path(gudevice)
 
-        dev = device.get_device_object(gudevice)
-        old_dev = self.devices_tree[dev.path]
-        self.devices_tree[dev.path] = dev
-        self.emit('changed', dev, old_dev)
+        if not old_path or not self.devices_tree.has_key(old_path):
+            self.device_added(gudevice, subsystem, dev)
+            return
+
+        old_devs = [(path, copy.copy(self.devices_tree[path])) 
+            for path in self.__subtree(old_path)]
+
+        self.children_index.get(self.__index_key(old_path), set()
+            ).discard(old_path)
+
+        # The new parent, if it is another one, may be missing yet
+        parent = gudevice.get_parent()
+        if self.parent_tree and parent is not None:
+            self.__explore_parent(parent, self.devices_tree, True)
+
+        for path, old_dev in old_devs:
+            dev = self.devices_tree.pop(path)
+            path = new_path + path[len(old_path):]
+            self.identity_map.rekey(old_dev.path, path)
+
+            if path == new_path:
+                dev = self.identity_map.lookup(gudevice, path)
+            else:
+                dev.update(dev.device.moved(old_path, new_path))
+            self.devices_tree[path] = dev
+
+            children = self.children_index.pop(old_dev.path, None)
+            if children is not None:
+                self.children_index[path] = set([new_path + 
+                    child[len(old_path):] for child in children])
+
+        self.children_index.setdefault(self.__index_key(new_path), set()
+            ).add(new_path)
+
+        for path, old_dev in old_devs:
+            self.__notify('moved', self.devices_tree[new_path + 
+                path[len(old_path):]], old_dev)
+
+    def device_bound(self, gudevice, subsystem, dev=None):
+        '''Called when a driver has been bound to a device'''
+        self.__refresh('bound', gudevice, subsystem, dev)
+
+    def device_unbound(self, gudevice, subsystem, dev=None):
+        '''Called when a device has been unbound from its driver'''
+        self.__refresh('unbound', gudevice, subsystem, dev)
+
+    def device_online(self, gudevice, subsystem, dev=None):
+        '''Called when a device (i.e. a cpu or memory block) went online'''
+        self.__refresh('online', gudevice, subsystem, dev)
+
+    def device_offline(self, gudevice, subsystem, dev=None):
+        '''Called when a device (i.e. a cpu or memory block) went offline'''
+        self.__refresh('offline', gudevice, subsystem, dev)
+
+    def __refresh(self, signal, gudevice, subsystem, dev=None):
+        '''
+        Update the Device of gudevice in place, taking dev, the one
+        decode_events built for it, if any
+        '''
+        path = gudevice.get_sysfs_path()
+        if not self.devices_tree.has_key(path):
+            self.device_added(gudevice, subsystem, dev)
+            return
+
+        dev, old_dev = self.identity_map.update(gudevice, dev)
+        old_dev = old_dev or self.devices_tree[path]
+        self.devices_tree[path] = dev
+        self.__notify(signal, dev, old_dev)
+
+    def __subtree(self, path):
+        '''
+        The paths on the tree of the device at path and its descendants,
+        parents first
+        '''
+        paths = [path]
+        for path in paths:
+            paths.extend(self.children_index.get(path, ()))
+        return paths
+
+    def __index_key(self, path):
+        '''
+        The children index entry of the device at path: the closest of its
+        ancestors on the tree, as sysfs nests devices below their parents
+        '''
+        parent_path = os.path.dirname(path)
+        while len(parent_path) > 1:
+            if self.devices_tree.has_key(parent_path):
+                return parent_path
+            parent_path = os.path.dirname(parent_path)
+        return None
+
+    def __index_added(self, path):
+        '''
+        Index a device added to a flat tree, taking in those of its
+        descendants which came before it
+        '''
+        siblings = self.children_index.setdefault(self.__index_key(path),
+            set())
+        prefix = path + '/'
+        adopted = [sibling for sibling in siblings 
+            if sibling.startswith(prefix)]
+        if adopted:
+            siblings.difference_update(adopted)
+            self.children_index.setdefault(path, set()).update(adopted)
+        siblings.add(path)
 
 GObject.type_register(DeviceFinder)
 
@@ -173,7 +768,7 @@ if __name__ == '__main__':
     finder.connect('changed', changes)
 
     finder.scan_subsystems()
-    pprint.pprint(finder.devices_list)
+    pprint.pprint(list(finder.get_devices()))
 
     loop = GObject.MainLoop()
     loop.run()
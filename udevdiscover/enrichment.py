@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+'''
+The slow fields of Devices, read out of the main loop after a scan.
+'''
+
+import itertools
+import logging
+import Queue
+import threading
+
+from gi.repository import GObject
+
+# Lower goes first
+SELECTED, VISIBLE, BACKGROUND = range(3)
+STOP = -1
+
+class DeviceEnricher(object):
+    '''
+    Reads the slow fields of Devices (see Device.enrich) on a pool of
+    threads, the ones pushed with the lowest priority first, and hands
+    them back to the GLib main loop by calling deliver(devices) with those
+    done, at most once every interval milliseconds. Devices are only
+    marked enriched from the main loop, right before being delivered.
+    '''
+
+    def __init__(self, deliver, threads=2, interval=100):
+        self.deliver = deliver
+        self.interval = interval
+        self.queue = Queue.PriorityQueue()
+        self.order = itertools.count()
+        self.lock = threading.Lock()
+
+        # The priority each pending Device was last pushed with, by id
+        self.pending = {}
+        self.done = []
+        self.flush_id = None
+
+        self.enriched = 0
+        self.batches = 0
+
+        GObject.threads_init()
+        self.threads = []
+        for i in range(threads):
+            thread = threading.Thread(target=self.__run,
+                name='udevdiscover-enrich-%d' % i)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def push(self, devices, priority=BACKGROUND):
+        '''
+        Queue devices for enrichment, or move them up if they were
+        already queued with a lower priority
+        '''
+        with self.lock:
+            for dev in devices:
+                if dev.enriched:
+                    continue
+                pending = self.pending.get(id(dev))
+                if pending is not None and pending <= priority:
+                    continue
+                # Any entry pushed before for dev is skipped when taken
+                self.pending[id(dev)] = priority
+                self.queue.put((priority, self.order.next(), dev))
+
+    def clear(self):
+        '''Forget the devices still queued'''
+        with self.lock:
+            self.pending.clear()
+
+    def stop(self):
+        self.clear()
+        for thread in self.threads:
+            self.queue.put((STOP, self.order.next(), None))
+
+    def __run(self):
+        while True:
+            priority, order, dev = self.queue.get()
+            if priority == STOP:
+                break
+
+            with self.lock:
+                if self.pending.get(id(dev)) != priority:
+                    continue
+                del self.pending[id(dev)]
+
+            snapshot = dev.device
+            try:
+                values = dev.read_enrichment()
+            except Exception:
+                logging.getLogger('udevdiscover').exception(
+                    'Failed to enrich %s', dev.path)
+                values = {}
+
+            with self.lock:
+                self.done.append((dev, snapshot, values))
+                if self.flush_id is None:
+                    self.flush_id = GObject.timeout_add(self.interval,
+                        self.__flush)
+
+    def __flush(self):
+        with self.lock:
+            done, self.done = self.done, []
+            self.flush_id = None
+
+        devices = []
+        stale = []
+        for dev, snapshot, values in done:
+            if dev.device is snapshot:
+                dev.enrich(values)
+                devices.append(dev)
+            else:
+                # Updated meanwhile, so read again
+                stale.append(dev)
+
+        if stale:
+            self.push(stale)
+        if devices:
+            self.enriched += len(devices)
+            self.batches += 1
+            self.deliver(devices)
+        return False
+
+    def get_stats(self):
+        return {
+            'pending': len(self.pending),
+            'enriched': self.enriched,
+            'batches': self.batches,
+        }
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+import logging
+import Queue
+import threading
+import time
+
+from gi.repository import GObject
+
+# What push() does when the queue is full
+BLOCK, DROP_NEWEST, DROP_OLDEST = 'block', 'drop-newest', 'drop-oldest'
+POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST)
+
+class EventWorker(object):
+    '''
+    Runs decode(job) on a worker thread for every job pushed into a
+    bounded queue, and hands the results back to the GLib main loop by
+    calling deliver(job, result) from it. result is None if decode failed.
+
+    When the queue is full, the BLOCK policy makes push() wait for room,
+    DROP_NEWEST discards the job being pushed and DROP_OLDEST the one
+    waiting for the longest time.
+    '''
+
+    def __init__(self, decode, deliver, maxsize=256, policy=BLOCK):
+        if not policy in POLICIES:
+            raise ValueError, 'Unknown overflow policy %s' % policy
+
+        self.decode = decode
+        self.deliver = deliver
+        self.policy = policy
+        self.queue = Queue.Queue(maxsize)
+
+        self.max_depth = 0
+        self.processed = 0
+        self.dropped = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+        GObject.threads_init()
+        self.thread = threading.Thread(target=self.__run,
+            name='udevdiscover-events')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def push(self, job):
+        item = (time.time(), job)
+
+        if self.policy == BLOCK:
+            self.queue.put(item)
+        elif self.policy == DROP_NEWEST:
+            try:
+                self.queue.put_nowait(item)
+            except Queue.Full:
+                self.dropped += 1
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    break
+                except Queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except Queue.Empty:
+                        pass
+
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def stop(self):
+        self.queue.put((None, None))
+
+    def __run(self):
+        while True:
+            pushed, job = self.queue.get()
+            if pushed is None:
+                break
+
+            try:
+                result = self.decode(job)
+            except Exception:
+                logging.getLogger('udevdiscover').exception(
+                    'Failed to decode %r', job)
+                result = None
+
+            GObject.idle_add(self.__deliver, pushed, job, result)
+
+    def __deliver(self, pushed, job, result):
+        latency = time.time() - pushed
+        self.processed += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+        self.deliver(job, result)
+        return False
+
+    def get_stats(self):
+        return {
+            'depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'mean_latency': self.processed and \
+                self.total_latency / self.processed or 0.0,
+            'max_latency': self.max_latency,
+        }
@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+The udev hardware database, read in-process: the compiled hwdb.bin trie
+through a read-only mmap, or the text .hwdb sources when there is none.
+'''
+
+import atexit
+import exceptions
+import fnmatch
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+
+from namecache import NameCache, get_cache_dir
+
+HWDB_BIN_PATHS = ['/etc/systemd/hwdb/hwdb.bin', '/etc/udev/hwdb.bin',
+    '/usr/lib/systemd/hwdb/hwdb.bin', '/lib/systemd/hwdb/hwdb.bin',
+    '/usr/lib/udev/hwdb.bin', '/lib/udev/hwdb.bin']
+
+# Sources in earlier directories override the same file name in later ones
+HWDB_DIRS = ['/etc/udev/hwdb.d', '/usr/lib/udev/hwdb.d', '/lib/udev/hwdb.d']
+
+SIGNATURE = 'KSLPHHRH'
+GLOB_CHARS = '*?['
+
+# struct trie_header_f, trie_node_f, trie_child_entry_f and the two
+# versions of trie_value_entry_f, all little endian
+HEADER = struct.Struct('<8s9Q')
+NODE = struct.Struct('<QB7xQ')
+CHILD = struct.Struct('<B7xQ')
+VALUE = struct.Struct('<QQ')
+VALUE2 = struct.Struct('<QQQIH2x')
+
+class HwdbError(exceptions.Exception):
+    pass
+
+class BinaryHwdb(object):
+    '''
+    A compiled hwdb.bin. Its trie nodes are decoded from the mapping the
+    first time a lookup walks through them, and kept.
+    '''
+
+    def __init__(self, path):
+        hwdb_file = open(path, 'rb')
+        try:
+            self.mtime = os.fstat(hwdb_file.fileno()).st_mtime
+            self.data = mmap.mmap(hwdb_file.fileno(), 0,
+                access=mmap.ACCESS_READ)
+        finally:
+            hwdb_file.close()
+
+        if len(self.data) < HEADER.size:
+            raise HwdbError, 'Truncated hwdb %s' % path
+
+        (signature, self.tool_version, file_size, header_size,
+            self.node_size, self.child_size, self.value_size,
+            self.root, nodes_len, strings_len) = HEADER.unpack_from(self.data)
+
+        if signature != SIGNATURE:
+            raise HwdbError, 'Bad signature in hwdb %s' % path
+        if file_size != len(self.data) or self.node_size < NODE.size or \
+                self.child_size < CHILD.size or self.value_size < VALUE.size:
+            raise HwdbError, 'Unsupported layout of hwdb %s' % path
+
+        self.path = path
+        self.ordered = self.value_size >= VALUE2.size
+        self.nodes = {}
+        self.patterns = {}
+
+    def __string(self, offset):
+        return self.data[offset:self.data.find('\0', offset)]
+
+    def __node(self, offset):
+        node = self.nodes.get(offset)
+        if node is not None:
+            return node
+
+        data = self.data
+        prefix_off, children_count, values_count = NODE.unpack_from(data,
+            offset)
+        position = offset + self.node_size
+
+        children = {}
+        for i in xrange(children_count):
+            char, child_off = CHILD.unpack_from(data, position)
+            children[chr(char)] = child_off
+            position += self.child_size
+
+        values = []
+        for i in xrange(values_count):
+            if self.ordered:
+                key_off, value_off, filename_off, line_number, priority = \
+                    VALUE2.unpack_from(data, position)
+                values.append((key_off, value_off, (priority, line_number)))
+            else:
+                key_off, value_off = VALUE.unpack_from(data, position)
+                values.append((key_off, value_off, None))
+            position += self.value_size
+
+        prefix = prefix_off and self.__string(prefix_off) or ''
+        # Where the prefix stops being a literal, if it does
+        glob = min([prefix.find(char) % (len(prefix) + 1)
+            for char in GLOB_CHARS])
+        if glob == len(prefix):
+            glob = -1
+        node = (prefix, glob, children,
+            [(char, children[char]) for char in GLOB_CHARS
+                if children.has_key(char)],
+            values)
+        self.nodes[offset] = node
+        return node
+
+    def __add(self, values, found):
+        for key_off, value_off, order in values:
+            # Keys are stored behind a blank, a property marker
+            key = self.__string(key_off)[1:]
+            # On duplicates the later file, then the later line wins
+            if order is not None and found.has_key(key) and \
+                    found[key][1] > order:
+                continue
+            found[key] = (self.__string(value_off), order)
+
+    def __match(self, pattern, string):
+        match = self.patterns.get(pattern)
+        if match is None:
+            match = re.compile(fnmatch.translate(pattern)).match
+            self.patterns[pattern] = match
+        return match(string) is not None
+
+    def __fnmatch(self, node, start, pattern, search, found):
+        prefix, glob, children, glob_children, values = node
+        pattern += prefix[start:]
+
+        for char, child_off in children.iteritems():
+            self.__fnmatch(self.__node(child_off), 0, pattern + char, search,
+                found)
+
+        if values and self.__match(pattern, search):
+            self.__add(values, found)
+
+    def __search(self, modalias, found):
+        node = self.__node(self.root)
+        i = 0
+
+        while node is not None:
+            prefix, glob, children, glob_children, values = node
+
+            if glob != -1:
+                # The rest of the trie below is matched as a pattern
+                if modalias.startswith(prefix[:glob], i):
+                    self.__fnmatch(node, glob, '', modalias[i + glob:], found)
+                return
+            if not modalias.startswith(prefix, i):
+                return
+            i += len(prefix)
+
+            for char, child_off in glob_children:
+                self.__fnmatch(self.__node(child_off), 0, char, modalias[i:],
+                    found)
+
+            if i == len(modalias):
+                self.__add(values, found)
+                return
+
+            child_off = children.get(modalias[i])
+            node = child_off is not None and self.__node(child_off) or None
+            i += 1
+
+    def lookup(self, modalias):
+        '''The properties of every entry matching modalias, as a dict'''
+
+        found = {}
+        self.__search(modalias, found)
+        return dict((key, value) for key, (value, order) in found.iteritems())
+
+    def close(self):
+        self.data.close()
+
+class TextHwdb(object):
+    '''
+    The .hwdb sources, for hosts without a compiled hwdb.bin. Entries are
+    indexed by the literal start of their match patterns, so a lookup
+    only tries the patterns sharing a start with the modalias.
+    '''
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.entries = {}
+        self.lengths = []
+        self.mtime = 0
+        self.patterns = {}
+
+        for priority, path in enumerate(paths):
+            try:
+                self.mtime = max(self.mtime, os.stat(path).st_mtime)
+                self.__parse(path, priority)
+            except EnvironmentError, e:
+                logging.getLogger('udevdiscover').warning(
+                    'Skipping hwdb source %s: %s', path, e)
+
+        self.lengths.sort()
+
+    def __parse(self, path, priority):
+        matches, props = [], None
+        lengths = set(self.lengths)
+
+        for line_number, line in enumerate(open(path)):
+            line = line.rstrip('\r\n')
+
+            if not line:
+                matches, props = [], None
+            elif line[0] == '#':
+                continue
+            elif line[0] == ' ':
+                if not matches:
+                    continue
+                if props is None:
+                    # The first property closes the list of matches
+                    props = {}
+                    order = (priority, line_number)
+                    for match in matches:
+                        literal = match
+                        for char in GLOB_CHARS:
+                            index = literal.find(char)
+                            if index != -1:
+                                literal = literal[:index]
+                        self.entries.setdefault(literal, []).append(
+                            (match, props, order))
+                        lengths.add(len(literal))
+                key, sep, value = line.lstrip().partition('=')
+                if sep:
+                    props[key] = value
+            elif props is not None:
+                # A match line after properties starts a new entry
+                matches, props = [line], None
+            else:
+                matches.append(line)
+
+        self.lengths = list(lengths)
+
+    def __match(self, pattern, string):
+        match = self.patterns.get(pattern)
+        if match is None:
+            match = re.compile(fnmatch.translate(pattern)).match
+            self.patterns[pattern] = match
+        return match(string) is not None
+
+    def lookup(self, modalias):
+        '''The properties of every entry matching modalias, as a dict'''
+
+        matched = []
+        for length in self.lengths:
+            if length > len(modalias):
+                break
+            for pattern, props, order in self.entries.get(modalias[:length], ()):
+                if len(pattern) == length:
+                    if pattern == modalias:
+                        matched.append((order, props))
+                elif self.__match(pattern, modalias):
+                    matched.append((order, props))
+
+        found = {}
+        for order, props in sorted(matched):
+            found.update(props)
+        return found
+
+    def close(self):
+        pass
+
+def get_hwdb_sources(dirs=HWDB_DIRS):
+    '''The .hwdb files of dirs, ordered by name as udev compiles them'''
+
+    sources = {}
+    for directory in reversed(dirs):
+        try:
+            names = os.listdir(directory)
+        except EnvironmentError:
+            continue
+        for name in names:
+            if name.endswith('.hwdb'):
+                sources[name] = os.path.join(directory, name)
+
+    return [sources[name] for name in sorted(sources)]
+
+def open_hwdb(bin_paths=HWDB_BIN_PATHS, dirs=HWDB_DIRS):
+    '''The first readable hwdb.bin of bin_paths, or else the sources'''
+
+    for path in bin_paths:
+        if not os.path.exists(path):
+            continue
+        try:
+            return BinaryHwdb(path)
+        except (HwdbError, EnvironmentError), e:
+            logging.getLogger('udevdiscover').warning(
+                'Skipping hwdb %s: %s', path, e)
+
+    return TextHwdb(get_hwdb_sources(dirs))
+
+def get_hwdb_mtime(bin_paths=HWDB_BIN_PATHS, dirs=HWDB_DIRS):
+    '''
+    The mtime of the hwdb open_hwdb() would pick, found without opening
+    it. For the sources, the latest of theirs and of their directories,
+    which catches removed ones.
+    '''
+
+    for path in bin_paths:
+        if os.path.exists(path):
+            return os.stat(path).st_mtime
+
+    mtimes = [0]
+    for path in list(dirs) + get_hwdb_sources(dirs):
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except EnvironmentError:
+            pass
+    return max(mtimes)
+
+_hwdb = None
+_names = None
+# Guards opening them, which may be first asked for by several threads
+_lock = threading.Lock()
+
+def get_hwdb():
+    '''The hwdb of this host, opened on first use'''
+
+    global _hwdb
+    if _hwdb is None:
+        with _lock:
+            if _hwdb is None:
+                _hwdb = open_hwdb()
+    return _hwdb
+
+def lookup(modalias):
+    if not modalias:
+        return {}
+    return get_hwdb().lookup(modalias)
+
+def resolve_vendor_model_names(modalias):
+    props = lookup(modalias)
+    return props.get('ID_VENDOR_FROM_DATABASE'), \
+        props.get('ID_MODEL_FROM_DATABASE')
+
+def get_name_cache():
+    '''
+    The vendor and model names cache, saved at exit. On a known machine
+    it spares opening the hwdb at all.
+    '''
+
+    global _names
+    if _names is None:
+        with _lock:
+            if _names is None:
+                names = NameCache(os.path.join(get_cache_dir(),
+                    'hwdb-names'), get_hwdb_mtime(),
+                    resolve_vendor_model_names)
+                atexit.register(names.save)
+                _names = names
+    return _names
+
+def get_vendor_model_names(modalias):
+    if not modalias:
+        return None, None
+    return get_name_cache().get(modalias)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+import copy
+
+import device
+
+class DeviceIdentityMap(object):
+    '''
+    Owns the typed Device objects of a DeviceFinder, keyed by sysfs path,
+    so scans, uevents and Device.parent all share the same instances
+    '''
+
+    def __init__(self, factory=device.get_device_object, keep_handles=True):
+        '''
+        If keep_handles is False, Devices drop their GUdev.Device once
+        built and keep only its snapshot, to save memory
+        '''
+        self.factory = factory
+        self.keep_handles = keep_handles
+        self.devices = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __contains__(self, path):
+        return path in self.devices
+
+    def get(self, path):
+        return self.devices.get(path)
+
+    def lookup(self, gudevice, path=None, new_dev=None):
+        '''
+        Return the Device for gudevice, creating it on the first sight 
+        unless new_dev, already built for it, is given
+        '''
+
+        if path is None:
+            path = gudevice.get_sysfs_path()
+
+        dev = self.devices.get(path)
+        if dev is None:
+            self.misses += 1
+            return self.__create(path, gudevice, new_dev)
+
+        self.hits += 1
+        if dev.device.handle is not gudevice:
+            dev.rebind(gudevice)
+            self.__release(dev)
+        return dev
+
+    def update(self, gudevice, new_dev=None):
+        '''
+        Refresh the Device for gudevice in place and return it along with a
+        copy of its previous state (None if it was not known yet). new_dev
+        is a Device already built for gudevice, if any.
+        '''
+
+        path = gudevice.get_sysfs_path()
+        dev = self.devices.get(path)
+        if dev is None:
+            self.misses += 1
+            return self.__create(path, gudevice, new_dev), None
+
+        self.hits += 1
+        old_dev = copy.copy(dev)
+        if new_dev is None:
+            new_dev = self.factory(gudevice)
+
+        # A change can turn a device into another kind (i.e. a media being
+        # inserted into an optical drive), which can not be done in place
+        if type(new_dev) is type(dev):
+            # Along with its enrichment, which may have been read already
+            dev.adopt(new_dev)
+        else:
+            new_dev.identity_map = self
+            self.devices[path] = dev = new_dev
+        self.__release(dev)
+
+        return dev, old_dev
+
+    def evict(self, path):
+        '''Forget the Device at path, returning it if it was known'''
+
+        dev = self.devices.pop(path, None)
+        if dev is not None:
+            self.evictions += 1
+        return dev
+
+    def rekey(self, old_path, new_path):
+        '''Keep the Device of a device moved from old_path at new_path'''
+
+        dev = self.devices.pop(old_path, None)
+        if dev is not None:
+            self.devices[new_path] = dev
+        return dev
+
+    def clear(self):
+        self.devices.clear()
+
+    def get_stats(self):
+        return {
+            'size': len(self.devices),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def __create(self, path, gudevice, dev=None):
+        dev = dev or self.factory(gudevice)
+        dev.identity_map = self
+        self.devices[path] = dev
+        self.__release(dev)
+        return dev
+
+    def __release(self, dev):
+        if not self.keep_handles:
+            dev.release_handle()
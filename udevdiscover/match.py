@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+class DeviceMatch(object):
+    '''
+    Criteria a udev device must meet to be listed, checked in memory so a
+    single enumeration of the whole system serves any subsystems choice.
+
+    Every given criterion must be met, and within each of them any of the
+    values will do. properties maps a property name to its expected value,
+    or to None if just having the property is enough.
+    '''
+
+    def __init__(self, subsystems=None, devtypes=None, properties=None,
+            tags=None, drivers=None):
+        self.subsystems = subsystems and frozenset(subsystems) or None
+        self.devtypes = devtypes and frozenset(devtypes) or None
+        self.properties = properties and dict(properties) or None
+        self.tags = tags and frozenset(tags) or None
+        self.drivers = drivers and frozenset(drivers) or None
+
+    def __call__(self, gudevice):
+        if self.subsystems is not None and \
+                not gudevice.get_subsystem() in self.subsystems:
+            return False
+
+        if self.devtypes is not None and \
+                not gudevice.get_devtype() in self.devtypes:
+            return False
+
+        if self.drivers is not None and \
+                not gudevice.get_driver() in self.drivers:
+            return False
+
+        if self.properties is not None:
+            for key, value in self.properties.iteritems():
+                if not gudevice.has_property(key):
+                    return False
+                if value is not None and gudevice.get_property(key) != value:
+                    return False
+
+        if self.tags is not None and \
+                self.tags.isdisjoint(gudevice.get_tags()):
+            return False
+
+        return True
+
+    def is_empty(self):
+        return self.subsystems is None and self.devtypes is None and \
+            self.properties is None and self.tags is None and \
+            self.drivers is None
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+Names resolved from the hwdb, kept across runs in the user cache directory.
+'''
+
+from collections import OrderedDict
+import logging
+import marshal
+import os
+import threading
+
+CACHE_VERSION = 1
+
+# Far more than the devices of any one machine, docks and all
+MAX_ENTRIES = 4096
+
+def get_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'udev-discover')
+
+class NameCache(object):
+    '''
+    A bounded LRU of resolve(key) results, loaded from path and saved back
+    when it changed. The file holds the mtime of the database the names
+    came from, and is thrown away as a whole when that is not mtime. It
+    is shared by the threads building and enriching devices.
+    '''
+
+    def __init__(self, path, mtime, resolve, maxsize=MAX_ENTRIES):
+        self.path = path
+        self.mtime = mtime
+        self.resolve = resolve
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.hits = self.misses = self.evictions = 0
+        self.load()
+
+    def load(self):
+        try:
+            cache_file = open(self.path, 'rb')
+            try:
+                version, mtime, entries = marshal.load(cache_file)
+            finally:
+                cache_file.close()
+        except (EnvironmentError, EOFError, ValueError, TypeError):
+            return
+
+        if version != CACHE_VERSION or mtime != self.mtime:
+            # Names from another database: save over them
+            self.dirty = True
+            return
+
+        for key, value in entries[-self.maxsize:]:
+            self.entries[key] = value
+
+    def save(self):
+        with self.lock:
+            self.__save()
+
+    def __save(self):
+        if not self.dirty:
+            return
+
+        temp_path = '%s.%d' % (self.path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            cache_file = open(temp_path, 'wb')
+            try:
+                marshal.dump((CACHE_VERSION, self.mtime,
+                    self.entries.items()), cache_file)
+            finally:
+                cache_file.close()
+            os.rename(temp_path, self.path)
+            self.dirty = False
+        except EnvironmentError, e:
+            logging.getLogger('udevdiscover').warning(
+                'Could not save the names cache %s: %s', self.path, e)
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value = self.entries.pop(key)
+            except KeyError:
+                pass
+            else:
+                # The most recently used go last
+                self.entries[key] = value
+                self.hits += 1
+                return value
+
+        # Not under the lock, as it may be slow
+        value = self.resolve(key)
+
+        with self.lock:
+            self.misses += 1
+            self.dirty = True
+            self.entries[key] = value
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self.lock:
+            if self.entries:
+                self.entries.clear()
+                self.dirty = True
+
+    def get_stats(self):
+        return {'size': len(self.entries), 'hits': self.hits,
+            'misses': self.misses, 'evictions': self.evictions}
@@ -0,0 +1,596 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+A query language for filtering devices, such as
+
+    subsystem:block driver:sd* vendor~/^Intel/ -prop:ID_CDROM
+
+Terms are separated by spaces, and all of them must hold; OR splits a
+query into alternatives, any of which will do. A leading - negates a term.
+
+field:pattern compares a field case-insensitively, with shell wildcards,
+and field~/regex/ searches it with a regular expression (/regex/i ignores
+case). prop:KEY checks for a udev property, and prop:KEY=pattern or
+prop:KEY~/regex/ for its value too. Any other term is searched for as
+match_string() would. Values with spaces go between double quotes.
+
+A Query is parsed once into a tree of predicates, answered from the
+indexes of a DeviceFinder where they can, and by checking each device
+otherwise. explain() tells how it went for each of them.
+'''
+
+import fnmatch
+import re
+import time
+
+from device import match_string
+from searchindex import GRAM, INDEXED_FIELDS
+
+FIELD_GETTERS = {
+    'subsystem': lambda dev: dev.device.get_subsystem(),
+    'devtype': lambda dev: dev.device.get_devtype(),
+    'driver': lambda dev: dev.device.get_driver(),
+    'name': lambda dev: dev.device.get_name(),
+    'file': lambda dev: dev.device.get_device_file(),
+    'path': lambda dev: dev.path,
+    'label': lambda dev: dev.get_enriched('nice_label'),
+    'vendor': lambda dev: dev.get_enriched('vendor_name'),
+    'model': lambda dev: dev.get_enriched('model_name'),
+    'tag': lambda dev: dev.device.get_tags(),
+    'prop': lambda dev: dev.device.props,
+}
+
+FIELD_ALIASES = {'property': 'prop', 'tags': 'tag', 'sysfs_path': 'path'}
+
+TOKEN = re.compile(r'''
+    (?P<negate>-)?
+    (?:(?P<field>[A-Za-z_]+)(?P<op>[:~])
+        (?:(?P<key>[^\s"=~]+)(?P<key_op>[=~]))?)?
+    (?P<value>"(?:[^"\\]|\\.)*"?|/(?:[^/\\]|\\.)*/[A-Za-z]*(?=\s|$)|\S+)
+    ''', re.VERBOSE)
+QUOTED = re.compile(r'"(?:[^"\\]|\\.)*"$')
+
+GLOB_CHARS = re.compile(r'[*?[\]]')
+# What matches other than as itself in a glob: wildcards and whole [...]
+# or [!...] classes (an unclosed [ is a literal one to fnmatch)
+GLOB_WILDCARDS = re.compile(r'[*?]|\[!?\]?[^\]]*\]')
+
+class QueryError(Exception):
+    pass
+
+def unquote(value):
+    if not value.startswith('"'):
+        return value
+    if not QUOTED.match(value):
+        raise QueryError, 'Unterminated quote at %s' % value
+    return re.sub(r'\\(.)', r'\1', value[1:-1])
+
+def quote(value):
+    '''value as written in a query, so that unquote gives it back'''
+    if not value or value == 'OR' or value.startswith('-') or \
+            re.search(r'[\s"]', value):
+        return '"%s"' % re.sub(r'(["\\])', r'\\\1', value)
+    return value
+
+def compile_pattern(op, pattern):
+    '''A function telling whether a value matches pattern, as op compares'''
+    if op == '~':
+        flags = 0
+        if pattern.startswith('/'):
+            end = pattern.rfind('/')
+            if end == 0:
+                raise QueryError, 'Unterminated regular expression %s' % pattern
+            for flag in pattern[end + 1:]:
+                if flag not in 'iI':
+                    raise QueryError, 'Unknown regular expression flag %s' \
+                        % flag
+                flags |= re.IGNORECASE
+            pattern = pattern[1:end]
+        try:
+            regex = re.compile(pattern, flags)
+        except re.error, e:
+            raise QueryError, 'Bad regular expression %s: %s' % (pattern, e)
+        return lambda value: regex.search(value) is not None
+
+    pattern = pattern.lower()
+    if GLOB_CHARS.search(pattern):
+        regex = re.compile(fnmatch.translate(pattern))
+        return lambda value: regex.match(value.lower()) is not None
+    return lambda value: value.lower() == pattern
+
+def get_literal(pattern):
+    '''The longest run of pattern matching as itself, lowercased'''
+    return max(GLOB_WILDCARDS.split(pattern.lower()), key=len)
+
+class Term(object):
+    '''field:pattern or field~regex over one of FIELD_GETTERS'''
+
+    def __init__(self, field, op, pattern):
+        self.field = field
+        self.op = op
+        self.pattern = pattern
+        self.test = compile_pattern(op, pattern)
+
+    def __str__(self):
+        return '%s%s%s' % (self.field, self.op, quote(self.pattern))
+
+    def match(self, dev):
+        value = FIELD_GETTERS[self.field](dev)
+        if value is None:
+            return False
+        if self.field == 'tag':
+            return any([self.test(tag) for tag in value])
+        return self.test(value)
+
+    def lookup(self, plan):
+        if self.field in INDEXED_FIELDS and plan.field_index is not None:
+            values = [value for value in
+                plan.field_index.get_values(self.field) if self.test(value)]
+            paths = plan.get_value_paths(self.field, values)
+            plan.note('index %s (%d of %d values)' % (self, len(values),
+                len(plan.field_index.get_values(self.field))), paths)
+            return paths
+
+        # Fields are all in the search text, so the devices holding a
+        # literal part of the pattern there are the only candidates
+        if self.op == ':' and plan.search_index is not None:
+            literal = get_literal(self.pattern)
+            if len(literal) >= GRAM:
+                candidates = plan.search_index.search(literal)
+                paths = plan.check(self, candidates)
+                plan.note('text index "%s", check %s on %d rows' % (
+                    literal, self, len(candidates)), paths)
+                return paths
+
+        return None
+
+class PropertyTerm(Term):
+    '''prop:KEY, prop:KEY=pattern or prop:KEY~regex'''
+
+    def __init__(self, key, op=None, pattern=None):
+        self.field = 'prop'
+        self.key = key
+        self.op = op
+        self.pattern = pattern
+        self.test_key = compile_pattern(':', key)
+        self.test = op is not None and compile_pattern(op, pattern) or None
+
+    def __str__(self):
+        if self.op is None:
+            return 'prop:%s' % self.key
+        return 'prop:%s%s%s' % (self.key, self.op == ':' and '=' or self.op,
+            quote(self.pattern))
+
+    def match(self, dev):
+        for key, value in dev.device.props.iteritems():
+            if self.test_key(key) and (self.test is None or self.test(value)):
+                return True
+        return False
+
+    def lookup(self, plan):
+        if plan.field_index is None:
+            return None
+
+        all_keys = plan.field_index.get_values('prop')
+        keys = [key for key in all_keys if self.test_key(key)]
+        candidates = plan.get_value_paths('prop', keys)
+        if self.test is None:
+            plan.note('index %s (%d of %d keys)' % (self, len(keys),
+                len(all_keys)), candidates)
+            return candidates
+
+        paths = plan.check(self, candidates)
+        plan.note('index prop:%s (%d of %d keys), check %s on %d rows' % (
+            self.key, len(keys), len(all_keys), self, len(candidates)), paths)
+        return paths
+
+class TextTerm(object):
+    '''Text searched for as match_string() would'''
+
+    def __init__(self, text):
+        self.text = text.lower()
+
+    def __str__(self):
+        return quote(self.text)
+
+    def match(self, dev):
+        return match_string(dev, self.text)
+
+    def lookup(self, plan):
+        if plan.search_index is None:
+            return None
+        paths = plan.search_index.search(self.text)
+        plan.note('text index %s' % self, paths)
+        return paths
+
+class Not(object):
+
+    def __init__(self, term):
+        self.term = term
+
+    def __str__(self):
+        return '-%s' % self.term
+
+    def match(self, dev):
+        return not self.term.match(dev)
+
+    def lookup(self, plan):
+        if plan.field_index is None:
+            return None
+
+        step = plan.begin('not')
+        plan.depth += 1
+        try:
+            excluded = self.term.lookup(plan)
+        finally:
+            plan.depth -= 1
+        if excluded is None:
+            plan.rewind(step)
+            return None
+
+        paths = plan.field_index.get_paths()
+        paths.difference_update(excluded)
+        plan.end(step, paths)
+        return paths
+
+class And(object):
+    '''
+    Intersects what the indexes give for its terms, smallest first, takes
+    away what they give for the negated ones, and only checks the terms
+    no index answers on the devices left.
+    '''
+
+    def __init__(self, terms):
+        self.terms = terms
+
+    def __str__(self):
+        return ' '.join([str(term) for term in self.terms])
+
+    def match(self, dev):
+        for term in self.terms:
+            if not term.match(dev):
+                return False
+        return True
+
+    def lookup(self, plan):
+        step = plan.begin('and')
+        found, excluded, unindexed = [], [], []
+
+        plan.depth += 1
+        try:
+            for term in self.terms:
+                # Taken away rather than complemented and intersected
+                if isinstance(term, Not):
+                    step_not = plan.begin('not')
+                    plan.depth += 1
+                    try:
+                        paths = term.term.lookup(plan)
+                    finally:
+                        plan.depth -= 1
+                    if paths is None:
+                        plan.rewind(step_not)
+                        unindexed.append(term)
+                    else:
+                        plan.end(step_not, paths)
+                        excluded.append(paths)
+                    continue
+
+                paths = term.lookup(plan)
+                if paths is None:
+                    unindexed.append(term)
+                else:
+                    found.append(paths)
+
+            if not found:
+                plan.rewind(step)
+                return None
+
+            found.sort(key=len)
+            paths = set(found[0])
+            for other in found[1:]:
+                paths.intersection_update(other)
+            for other in excluded:
+                paths.difference_update(other)
+
+            for term in unindexed:
+                candidates = len(paths)
+                paths = plan.check(term, paths)
+                plan.note('check %s on %d rows' % (term, candidates), paths)
+        finally:
+            plan.depth -= 1
+
+        plan.end(step, paths)
+        return paths
+
+class Or(object):
+
+    def __init__(self, alternatives):
+        self.alternatives = alternatives
+
+    def __str__(self):
+        return ' OR '.join([str(alternative)
+            for alternative in self.alternatives])
+
+    def match(self, dev):
+        for alternative in self.alternatives:
+            if alternative.match(dev):
+                return True
+        return False
+
+    def lookup(self, plan):
+        step = plan.begin('or')
+        paths = set()
+
+        plan.depth += 1
+        try:
+            for alternative in self.alternatives:
+                found = alternative.lookup(plan)
+                if found is None:
+                    # Checking every device will have to do for all of them
+                    plan.rewind(step)
+                    return None
+                paths.update(found)
+        finally:
+            plan.depth -= 1
+
+        plan.end(step, paths)
+        return paths
+
+def parse_term(match):
+    negate, field, op, key, key_op, value = match.group('negate', 'field',
+        'op', 'key', 'key_op', 'value')
+
+    if field is not None:
+        field = FIELD_ALIASES.get(field.lower(), field.lower())
+
+    if field == 'prop':
+        if op == '~':
+            raise QueryError, 'Properties are matched as prop:KEY~regex'
+        if key is None:
+            term = PropertyTerm(unquote(value))
+        else:
+            term = PropertyTerm(key, key_op == '=' and ':' or '~',
+                unquote(value))
+    elif FIELD_GETTERS.has_key(field):
+        if key is not None:
+            # Not a property, so it was part of the value
+            value = key + key_op + value
+        term = Term(field, op, unquote(value))
+    else:
+        # Not a field after all, e.g. a modalias
+        term = TextTerm(unquote(match.group(0)[len(negate or ''):]))
+
+    if negate:
+        return Not(term)
+    return term
+
+def parse(text):
+    '''The tree of predicates of a query'''
+    alternatives = [[]]
+    pos = 0
+    while True:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos == len(text):
+            break
+
+        match = TOKEN.match(text, pos)
+        pos = match.end()
+        if match.group(0) == 'OR':
+            if not alternatives[-1]:
+                raise QueryError, 'Nothing before OR'
+            alternatives.append([])
+        else:
+            alternatives[-1].append(parse_term(match))
+
+    if len(alternatives) > 1 and not alternatives[-1]:
+        raise QueryError, 'Nothing after OR'
+
+    alternatives = [len(terms) == 1 and terms[0] or And(terms)
+        for terms in alternatives]
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return Or(alternatives)
+
+def get_terms(root):
+    '''The terms all of which must hold for root to, or None for an Or'''
+    if isinstance(root, Or):
+        return None
+    if isinstance(root, And):
+        return root.terms
+    return [root]
+
+def implies(term, other):
+    '''Whether every device term holds for has other holding too'''
+    if isinstance(term, TextTerm) and isinstance(other, TextTerm):
+        return other.text in term.text
+    return str(term) == str(other)
+
+class Plan(object):
+    '''
+    The steps a query was answered by, with the rows each of them gave, as
+    a list of [depth, description, rows]
+    '''
+
+    def __init__(self, finder):
+        self.devices_tree = finder.devices_tree
+        self.field_index = finder.field_index
+        self.search_index = finder.search_index
+        self.steps = []
+        self.depth = 0
+        self.elapsed = None
+
+    def begin(self, description):
+        self.steps.append([self.depth, description, None])
+        return len(self.steps) - 1
+
+    def end(self, step, paths):
+        self.steps[step][2] = len(paths)
+
+    def rewind(self, step):
+        del self.steps[step:]
+
+    def note(self, description, paths):
+        self.steps.append([self.depth, description, len(paths)])
+
+    def get_value_paths(self, field, values):
+        paths = set()
+        field_values = self.field_index.get_values(field)
+        for value in values:
+            paths.update(field_values[value])
+        return paths
+
+    def check(self, node, paths):
+        devices_tree = self.devices_tree
+        return set([path for path in paths if node.match(devices_tree[path])])
+
+    def scan(self, node):
+        paths = set([dev.path for dev in self.devices_tree.itervalues()
+            if node.match(dev)])
+        self.note('scan %s' % node, paths)
+        return paths
+
+    def __str__(self):
+        lines = ['%s%s: %d rows' % ('  ' * depth, description, rows)
+            for depth, description, rows in self.steps]
+        if self.elapsed is not None:
+            lines.append('%.3f ms' % (self.elapsed * 1000))
+        return '\n'.join(lines)
+
+class Query(object):
+    '''
+    A query parsed once, to be answered or matched any number of times.
+    A literal one is just text searched for, as typed.
+    '''
+
+    def __init__(self, text, literal=False):
+        self.text = text
+        if literal:
+            self.root = TextTerm(text)
+        else:
+            self.root = parse(text)
+
+    def __str__(self):
+        return str(self.root)
+
+    def match(self, dev):
+        return self.root.match(dev)
+
+    def plan(self, finder):
+        '''The paths of the devices on finder matching, and how they were'''
+        plan = Plan(finder)
+        start = time.time()
+        paths = self.root.lookup(plan)
+        if paths is None:
+            paths = plan.scan(self.root)
+        plan.elapsed = time.time() - start
+        return paths, plan
+
+    def select(self, finder):
+        return self.plan(finder)[0]
+
+    def refine(self, previous):
+        '''
+        What the devices matching previous have to meet to match this query
+        too, if it refines previous: every term of previous is here, or
+        extended (text terms typed on). None if it does not.
+        '''
+        terms = get_terms(self.root)
+        previous_terms = get_terms(previous.root)
+        if terms is None or previous_terms is None:
+            if str(self) == str(previous):
+                return And([])
+            return None
+
+        for previous_term in previous_terms:
+            for term in terms:
+                if implies(term, previous_term):
+                    break
+            else:
+                return None
+
+        # Those already there hold for them
+        previous_terms = set([str(term) for term in previous_terms])
+        return And([term for term in terms
+            if not str(term) in previous_terms])
+
+    def explain(self, finder):
+        return str(self.plan(finder)[1])
+
+# Most the last matches may be of the tree for checking them to be worth
+# it, against answering afresh from the indexes or by checking every device
+INDEXED_REFINE_SHARE = 0.25
+SCAN_REFINE_SHARE = 0.5
+
+class IncrementalSearch(object):
+    '''
+    Answers the queries typed into a search box one after another. When a
+    query refines the previous one, only the devices that matched it are
+    checked for the terms added or extended, rather than the whole tree.
+    Devices added or changed in the meantime have to be check()ed to be
+    kept track of.
+    '''
+
+    def __init__(self, finder):
+        self.finder = finder
+        self.query = None
+        self.paths = set()
+        self.refined = 0
+
+    def search(self, query):
+        '''The paths of the devices on the tree matching query'''
+        devices_tree = self.finder.devices_tree
+        refinement = None
+        if self.query is not None:
+            if self.finder.search_index is not None:
+                share = INDEXED_REFINE_SHARE
+            else:
+                share = SCAN_REFINE_SHARE
+            if len(self.paths) <= len(devices_tree) * share:
+                refinement = query.refine(self.query)
+
+        if refinement is not None:
+            paths = set()
+            for path in self.paths:
+                dev = devices_tree.get(path)
+                # Removed devices are left behind until then
+                if dev is not None and refinement.match(dev):
+                    paths.add(path)
+            self.paths = paths
+            self.refined += 1
+        else:
+            self.paths = query.select(self.finder)
+        self.query = query
+        return self.paths
+
+    def check(self, dev):
+        '''Whether dev matches the last query, keeping track of it'''
+        if self.query is not None and self.query.match(dev):
+            self.paths.add(dev.path)
+            return True
+        self.paths.discard(dev.path)
+        return False
+
+    def clear(self):
+        self.query = None
+        self.paths = set()
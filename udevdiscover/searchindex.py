@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 
+###
+#
+# Copyright (c) 2011 J. Félix Ontañón
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors : J. Félix Ontañón <fontanon@emergya.es>
+# 
+
+
+'''
+Inverted indexes of the devices, for searches and queries over many of
+them: trigrams of the text they are searched by, and the values of the
+udev fields queries most often ask for.
+'''
+
+from array import array
+
+from device import SearchText
+
+GRAM = 3
+
+# Stale postings tolerated before compacting, besides as many as live ones
+MIN_STALE = 65536
+
+# The fields FieldIndex keeps, prop and tag by property key and tag name
+INDEXED_FIELDS = ('subsystem', 'devtype', 'driver', 'prop', 'tag')
+
+def get_grams(text):
+    return set([text[i:i + GRAM] for i in xrange(len(text) - GRAM + 1)])
+
+class TrigramIndex(object):
+    '''
+    Indexes the trigrams of the fields a device is searched by (see
+    SearchText), so that search() answers as match_string() would for all
+    of them at once: only the texts holding the rarest trigram of the
+    search string are candidates, and just those are checked for it.
+
+    The distinct field texts are indexed, rather than the devices: most of
+    them (subsystems, drivers, vendors, property keys) are shared by many
+    devices and get checked once. Devices added or changed are indexed on
+    the next search, so a burst of uevents costs nothing until then.
+
+    Postings are arrays of text ids, only appended to. Texts nobody has
+    any more leave their ids behind as stale entries, skipped when
+    checking the candidates and dropped by compacting the postings.
+    '''
+
+    def __init__(self):
+        # Texts by id, with the path of the device having each one, or a
+        # set of them if shared
+        self.text_ids = {}
+        self.texts = []
+        self.text_paths = []
+        self.free_ids = []
+
+        self.postings = {}
+        self.entries = 0
+        self.stale = 0
+
+        self.device_texts = {}
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.device_texts) + len([path for path in self.pending
+            if not self.device_texts.has_key(path)])
+
+    def add(self, dev):
+        '''Index dev, or index it again as it changed'''
+        self.pending[dev.path] = dev
+
+    def remove(self, path):
+        self.pending.pop(path, None)
+        self.__unindex(path)
+
+    def clear(self):
+        self.__init__()
+
+    def flush(self):
+        '''Index the devices added or changed since the last search'''
+        pending, self.pending = self.pending, {}
+        for path, dev in pending.iteritems():
+            self.__unindex(path)
+            self.__index(path, dev)
+
+        if self.stale > max(MIN_STALE, self.entries - self.stale):
+            self.compact()
+
+    def __index(self, path, dev):
+        ids = []
+        for text in set(dev.get_search_text().text.split(SearchText.SEPARATOR)):
+            text_id = self.text_ids.get(text)
+            if text_id is None:
+                text_id = self.__add_text(text)
+
+            paths = self.text_paths[text_id]
+            if paths is None:
+                self.text_paths[text_id] = path
+            elif isinstance(paths, set):
+                paths.add(path)
+            else:
+                self.text_paths[text_id] = set([paths, path])
+            ids.append(text_id)
+
+        self.device_texts[path] = ids
+
+    def __add_text(self, text):
+        if self.free_ids:
+            text_id = self.free_ids.pop()
+            self.texts[text_id] = text
+        else:
+            text_id = len(self.texts)
+            self.texts.append(text)
+            self.text_paths.append(None)
+
+        self.text_ids[text] = text_id
+        grams = get_grams(text)
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array('i')
+            posting.append(text_id)
+        self.entries += len(grams)
+        return text_id
+
+    def __unindex(self, path):
+        for text_id in self.device_texts.pop(path, ()):
+            paths = self.text_paths[text_id]
+            if isinstance(paths, set):
+                paths.discard(path)
+                if len(paths) == 1:
+                    self.text_paths[text_id] = paths.pop()
+                continue
+
+            # Nobody else has it, so it goes
+            text = self.texts[text_id]
+            del self.text_ids[text]
+            self.texts[text_id] = None
+            self.text_paths[text_id] = None
+            self.free_ids.append(text_id)
+            self.stale += len(get_grams(text))
+
+    def compact(self):
+        '''Build the postings again, without stale entries'''
+        self.postings = {}
+        self.entries = self.stale = 0
+        self.free_ids = []
+
+        texts, self.texts = self.texts, []
+        text_paths, self.text_paths = self.text_paths, []
+        self.text_ids = {}
+        renumbered = {}
+
+        for text_id, text in enumerate(texts):
+            if text is None:
+                continue
+            renumbered[text_id] = self.__add_text(text)
+            self.text_paths[-1] = text_paths[text_id]
+
+        for path, ids in self.device_texts.iteritems():
+            self.device_texts[path] = [renumbered[text_id] for text_id in ids]
+
+    def get_text_ids(self, search_string):
+        '''The ids of the indexed texts search_string is found in'''
+        self.flush()
+        texts = self.texts
+
+        if len(search_string) < GRAM:
+            return [text_id for text_id, text in enumerate(texts)
+                if text is not None and search_string in text]
+
+        candidates = None
+        for gram in get_grams(search_string):
+            posting = self.postings.get(gram)
+            if not posting:
+                return []
+            if candidates is None or len(posting) < len(candidates):
+                candidates = posting
+
+        # Stale ids may be there twice, or have been given to other texts
+        return [text_id for text_id in set(candidates)
+            if texts[text_id] is not None and search_string in texts[text_id]]
+
+    def search(self, search_string):
+        '''The paths of the devices whose fields hold search_string'''
+        search_string = search_string.lower()
+        if not search_string:
+            self.flush()
+            return set(self.device_texts)
+
+        paths = set()
+        for text_id in self.get_text_ids(search_string):
+            text_paths = self.text_paths[text_id]
+            if isinstance(text_paths, set):
+                paths.update(text_paths)
+            else:
+                paths.add(text_paths)
+        return paths
+
+    def get_stats(self):
+        self.flush()
+        return {'devices': len(self.device_texts), 'texts': len(self.text_ids),
+            'grams': len(self.postings), 'postings': self.entries,
+            'stale': self.stale}
+
+def get_field_values(dev):
+    '''The (field, value) pairs of dev on INDEXED_FIELDS'''
+    snapshot = dev.device
+    values = [('subsystem', snapshot.get_subsystem()),
+        ('devtype', snapshot.get_devtype()),
+        ('driver', snapshot.get_driver())]
+    values.extend([('prop', key) for key in snapshot.get_property_keys()])
+    values.extend([('tag', tag) for tag in snapshot.get_tags()])
+    return [(field, value) for field, value in values if value is not None]
+
+class FieldIndex(object):
+    '''
+    Maps each value of INDEXED_FIELDS to the paths of the devices having
+    it. Those fields take few distinct values, so patterns over them are
+    answered by checking the values rather than the devices. Like
+    TrigramIndex, devices are indexed on the next lookup.
+    '''
+
+    def __init__(self):
+        self.fields = dict([(field, {}) for field in INDEXED_FIELDS])
+        self.device_values = {}
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.device_values) + len([path for path in self.pending
+            if not self.device_values.has_key(path)])
+
+    def add(self, dev):
+        '''Index dev, or index it again as it changed'''
+        self.pending[dev.path] = dev
+
+    def remove(self, path):
+        self.pending.pop(path, None)
+        self.__unindex(path)
+
+    def clear(self):
+        self.__init__()
+
+    def flush(self):
+        '''Index the devices added or changed since the last lookup'''
+        pending, self.pending = self.pending, {}
+        for path, dev in pending.iteritems():
+            self.__unindex(path)
+            values = get_field_values(dev)
+            for field, value in values:
+                paths = self.fields[field].get(value)
+                if paths is None:
+                    paths = self.fields[field][value] = set()
+                paths.add(path)
+            self.device_values[path] = values
+
+    def __unindex(self, path):
+        for field, value in self.device_values.pop(path, ()):
+            paths = self.fields[field][value]
+            paths.discard(path)
+            if not paths:
+                del self.fields[field][value]
+
+    def get_values(self, field):
+        '''The distinct values of field, mapped to the paths having them'''
+        self.flush()
+        return self.fields[field]
+
+    def get_paths(self):
+        self.flush()
+        return set(self.device_values)
+
+    def get_stats(self):
+        self.flush()
+        stats = {'devices': len(self.device_values)}
+        for field, values in self.fields.iteritems():
+            stats[field] = len(values)
+        return stats
@@ -27,6 +27,13 @@ import gi
 gi.require_version("GConf", "2.0")
 from gi.repository import GConf
 
+# Moved to udevdiscover.caching, which does not need GConf, and re-exported
+# here for the code still importing them from utils
+from udevdiscover.caching import memoized, memoize
+
+__all__ = ['memoized', 'memoize', 'GConfKeysDict', 'GConfKeysDictError',
+    'GConfStore', 'GConfStoreError', 'TextBufferHandler']
+
 class GConfKeysDict(dict):
     VALID_KEY_TYPES = (bool, str, int, float, list, tuple, set)
     
@@ -111,32 +118,6 @@ class GConfStore(object):
 class GConfStoreError(exceptions.Exception):
     pass
 
-class memoized(object):
-   """Decorator that caches a function's return value each time it is called.
-   If called later with the same arguments, the cached value is returned, and
-   not re-evaluated.
-   """
-   def __init__(self, func):
-      self.func = func
-      self.cache = {}
-   def __call__(self, *args):
-      try:
-         return self.cache[args]
-      except KeyError:
-         value = self.func(*args)
-         self.cache[args] = value
-         return value
-      except TypeError:
-         # uncachable -- for instance, passing a list as an argument.
-         # Better to not cache than to blow up entirely.
-         return self.func(*args)
-   def __repr__(self):
-      """Return the function's docstring."""
-      return self.func.__doc__
-   def __get__(self, obj, objtype):
-      """Support instance methods."""
-      return functools.partial(self.__call__, obj)
-
 import logging
 
 class TextBufferHandler(logging.StreamHandler):